@@ -0,0 +1,60 @@
+import json
+import asyncio
+import queue
+from aiohttp import web
+
+import subscriber
+from subscriber import log, notifications_total
+from metrics import CONTENT_TYPE
+
+async def notify(request):
+    try:
+        data = await request.json(loads=json.loads)
+    except Exception as e:
+        notifications_total.inc(1, "invalid")
+        log.warning("❌ Malformed notification body: %s", e)
+        return web.json_response({"status": "invalid"}, status=400)
+
+    subscriber.log_notification(data)
+
+    try:
+        # Off the event loop: enqueueing takes the producer lock and, with --wal-sync-ms 0, waits for an msync
+        await asyncio.get_running_loop().run_in_executor(None, subscriber.enqueue_notification, data)
+    except queue.Full:
+        notifications_total.inc(1, "rejected")
+        log.warning("🚦 write_buffer full (%d), rejecting notification", subscriber.buffer_depth())
+        return web.json_response({"status": "busy"}, status=subscriber.BUSY_STATUS,
+                                 headers={"Retry-After": str(subscriber.RETRY_AFTER_SECONDS)})
+    except Exception as e:
+        notifications_total.inc(1, "invalid")
+        log.warning("❌ Malformed notification: %s", e)
+        return web.json_response({"status": "invalid"}, status=400)
+
+    notifications_total.inc(1, "accepted")
+    return web.json_response({"status": "received"})
+
+async def stats(request):
+    with subscriber.pool_stats_lock:
+        return web.json_response({"connections": dict(subscriber.pool_stats),
+                                  "known_tables": sorted(subscriber.known_tables),
+                                  "write_buffer": subscriber.buffer_depth(),
+                                  "wal": subscriber.wal.stats if subscriber.wal else None})
+
+async def metrics(request):
+    # aiohttp rejects a charset inside content_type, so the full header is set directly
+    return web.Response(body=subscriber.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+def create_app():
+    app = web.Application()
+    app.router.add_post("/notify", notify)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+if __name__ == "__main__":
+    args = subscriber.build_arg_parser("Asyncio Orion-LD notification receiver writing to HBase").parse_args()
+    subscriber.configure(args)
+    subscriber.reset_tables_on_start(args)
+    subscriber.start_writers()
+    subscriber.setup_subscription()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
@@ -0,0 +1,107 @@
+import os
+import csv
+import json
+import math
+import time
+import platform
+import statistics
+
+PERCENTILES = (50, 95, 99)
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_METRIC = "p50"
+
+def percentile(sorted_samples, p):
+    # Linear interpolation between closest ranks, same as numpy's default
+    if not sorted_samples:
+        return float("nan")
+    rank = (len(sorted_samples) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_samples[low] + (sorted_samples[high] - sorted_samples[low]) * (rank - low)
+
+def summarize(samples):
+    ordered = sorted(samples)
+    stats = {"count": len(ordered)}
+    if not ordered:
+        return stats
+    stats["min"] = ordered[0]
+    stats["max"] = ordered[-1]
+    stats["mean"] = statistics.fmean(ordered)
+    stats["stdev"] = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    stats["ci95"] = 1.96 * stats["stdev"] / (len(ordered) ** 0.5)
+    for p in PERCENTILES:
+        stats[f"p{p}"] = percentile(ordered, p)
+    return stats
+
+def run_metadata(**extra):
+    meta = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+    }
+    meta.update(extra)
+    return meta
+
+def flat_stats(result):
+    # "stats" keeps plain names, any other "<prefix>_stats" block becomes "<prefix>_<stat>"
+    flat = dict(result.get("stats", {}))
+    for key, value in result.items():
+        if key.endswith("_stats") and isinstance(value, dict):
+            prefix = key[:-len("stats")]
+            flat.update({prefix + k: v for k, v in value.items()})
+    return flat
+
+def write_results(path, results):
+    if path.endswith(".csv"):
+        flat = {name: flat_stats(r) for name, r in results["queries"].items()}
+        stat_names = sorted({k for stats in flat.values() for k in stats})
+        extra = ["rows", "bytes"]
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name"] + extra + stat_names)
+            for name, r in results["queries"].items():
+                writer.writerow([name] + [r.get(k) for k in extra] + [flat[name].get(k) for k in stat_names])
+    else:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+def load_results(path):
+    if path.endswith(".csv"):
+        queries = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                name = row.pop("name")
+                extra = {k: float(row.pop(k)) for k in ("rows", "bytes") if row.get(k)}
+                queries[name] = dict(extra, stats={k: float(v) for k, v in row.items() if v})
+        return {"meta": {"source": os.path.basename(path)}, "queries": queries}
+    with open(path) as f:
+        return json.load(f)
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, metric=DEFAULT_METRIC):
+    rows = []
+    for name, cur in current["queries"].items():
+        base = baseline["queries"].get(name)
+        if base is None:
+            continue
+        base_stats, cur_stats = flat_stats(base), flat_stats(cur)
+        if metric not in base_stats or metric not in cur_stats:
+            continue
+        before, after = base_stats[metric], cur_stats[metric]
+        change = (after - before) / before if before else float("inf")
+        rows.append({"name": name, "baseline": before, "current": after, "change": change,
+                     "regression": change > threshold})
+    return rows
+
+def print_comparison(rows, metric=DEFAULT_METRIC, threshold=DEFAULT_THRESHOLD, unit="s"):
+    print(f"📊 Comparing {metric} (regression threshold +{threshold:.0%})")
+    for r in rows:
+        flag = "❌ REGRESSION" if r["regression"] else ("✅ faster" if r["change"] < -threshold else "➖")
+        print(f"  {r['name']:<16} {r['baseline']:.6f}{unit} -> {r['current']:.6f}{unit} "
+              f"({r['change']:+.1%}) {flag}")
+    return [r for r in rows if r["regression"]]
+
+def format_stats(stats, unit="s"):
+    if not stats.get("count"):
+        return "no samples"
+    return (f"p50 {stats['p50']:.6f}{unit} | p95 {stats['p95']:.6f}{unit} | p99 {stats['p99']:.6f}{unit} | "
+            f"min {stats['min']:.6f}{unit} | max {stats['max']:.6f}{unit} | mean {stats['mean']:.6f}{unit} "
+            f"± {stats['ci95']:.6f}{unit}")
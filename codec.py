@@ -0,0 +1,62 @@
+import os
+import struct
+import numpy as np
+
+# Fixed-width big-endian cells: the layout Hive's HBase storage handler reads for "#b" mapped columns
+DOUBLE = struct.Struct(">d")
+INT = struct.Struct(">i")
+LONG = struct.Struct(">q")
+
+# Hive type of each sensor cell
+SENSOR_TYPES = {"temperature": "DOUBLE", "humidity": "INT", "brightness": "DOUBLE"}
+CELL_STRUCTS = {"DOUBLE": DOUBLE, "INT": INT, "BIGINT": LONG}
+CELL_DTYPES = {"DOUBLE": np.dtype(">f8"), "INT": np.dtype(">i4"), "BIGINT": np.dtype(">i8")}
+
+def _coerce(kind, value):
+    return float(value) if kind == "DOUBLE" else int(round(float(value)))
+
+def encode_value(sensor, value):
+    kind = SENSOR_TYPES[sensor]
+    return CELL_STRUCTS[kind].pack(_coerce(kind, value))
+
+def decode_value(sensor, cell):
+    return CELL_STRUCTS[SENSOR_TYPES[sensor]].unpack(cell)[0]
+
+def encode_millis(ts_millis):
+    return LONG.pack(int(ts_millis))
+
+def decode_millis(cell):
+    return LONG.unpack(cell)[0]
+
+def _encode_array(kind, values):
+    values = np.asarray(values, dtype=np.float64)
+    if kind != "DOUBLE":
+        values = np.round(values)
+    dtype = CELL_DTYPES[kind]
+    raw, width = values.astype(dtype).tobytes(), dtype.itemsize
+    # Plain bytes objects: a numpy "S" array would strip trailing zero bytes from the cells
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+def encode_values(sensor, values):
+    return _encode_array(SENSOR_TYPES[sensor], values)
+
+def encode_millis_many(ts_millis):
+    return _encode_array("BIGINT", ts_millis)
+
+def decode_many(kind, cells):
+    # cells may contain None for missing columns: they come back as NaN
+    out = np.full(len(cells), np.nan)
+    present = np.array([cell is not None for cell in cells], dtype=bool)
+    if present.any():
+        raw = b"".join(cell for cell in cells if cell is not None)
+        out[present] = np.frombuffer(raw, dtype=CELL_DTYPES[kind])
+    return out
+
+def local_timezone():
+    # IANA name of the zone the ingest side formats local times in (Hive needs the name, not an offset)
+    if os.environ.get("TZ"):
+        return os.environ["TZ"].lstrip(":")
+    try:
+        return os.path.realpath("/etc/localtime").split("zoneinfo/", 1)[1]
+    except (OSError, IndexError):
+        return "UTC"
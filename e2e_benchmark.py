@@ -0,0 +1,194 @@
+import os
+import glob
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import benchmark
+import fakes
+
+# Offline end-to-end benchmark: load_generator -> Orion-LD emulator -> subscriber (Flask or aiohttp receiver) ->
+# in-memory HBase, all in one process per configuration. Numbers are only comparable between runs of this script.
+
+RECEIVERS = ["flask", "aiohttp"]
+SUBSCRIBER_PORT = 18000
+DRAIN_TIMEOUT = 60.0
+
+def parse_list(kind):
+    return lambda value: [kind(item) for item in value.split(",")]
+
+def configuration_name(config):
+    return (f"{config['receiver']}-w{config['writers']}-b{config['write_batch']}-"
+            f"lat{config['put_latency_ms']:g}ms-s{config['sender_batch']}")
+
+def serve_receiver(receiver, port):
+    import subscriber
+    if receiver == "aiohttp":
+        import async_subscriber
+        fakes.serve_in_thread(async_subscriber.create_app(), "127.0.0.1", port)
+        return
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", port, subscriber.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+def point_simulator_at(orion):
+    import load_generator
+    import real_time_data_simulator
+    entities_url, ops_url = f"{orion.url}/entities/", f"{orion.url}/entityOperations/"
+    # load_generator imported the URLs by name, so both modules are patched
+    for module in (real_time_data_simulator, load_generator):
+        module.ORION_LD_URL = entities_url
+        module.ENTITY_OPS_URL = ops_url
+    real_time_data_simulator.TRACE_READINGS = True
+
+def first_writes(traces):
+    # Notifications carry every watched attribute, so unchanged readings come back with their old traceId;
+    # only the first write of each reading counts
+    first = {}
+    for trace in traces:
+        key = trace.get("trace_id")
+        if key not in first or trace["written"] < first[key]["written"]:
+            first[key] = trace
+    return first.values()
+
+def wait_for_drain(orion, timeout):
+    import subscriber
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if orion.idle() and subscriber.buffer_idle():
+            return True
+        time.sleep(0.01)
+    return False
+
+def run_configuration(config, options):
+    # Runs in a fresh process: the subscriber keeps its state in module globals and its writers never exit
+    hbase = fakes.install_fake_hbase(fakes.FakeHBase(config["put_latency_ms"] / 1000, options["row_latency_us"] / 1e6))
+    import subscriber
+    import load_generator
+    import real_time_data_simulator
+
+    orion = fakes.OrionEmulator(port=options["orion_port"]).start()
+    point_simulator_at(orion)
+    workdir = tempfile.mkdtemp(prefix="e2e-")
+    trace_path = os.path.join(workdir, "trace.jsonl")
+    argv = ["--writers", str(config["writers"]), "--batch-size", str(config["write_batch"]),
+            "--trace-log", trace_path, "--log-level", "WARNING", "--log-sample-rate", "0"]
+    if options["wal"]:
+        argv += ["--wal-dir", os.path.join(workdir, "wal"), "--wal-segment-mb", "16"]
+    if options["table_config"]:
+        argv += ["--table-config", options["table_config"]]
+    subscriber.configure(subscriber.build_arg_parser().parse_args(argv))
+    if subscriber.table_config is not None:
+        # The fake store is pre-split the way provision.create_table would split the real tables
+        subscriber.table_config["hbase_shell"] = None
+        for table_name in subscriber.HBASE_TABLES:
+            hbase.split_keys[table_name] = subscriber.ROW_KEY_CODEC.split_keys(subscriber.table_config["regions"]
+                                                                               or None)
+    subscriber.SUBS_URL = f"{orion.url}/subscriptions"
+    subscriber.payload["notification"]["endpoint"]["uri"] = f"http://127.0.0.1:{options['subscriber_port']}/notify"
+    subscriber.reset_tables()
+    subscriber.start_writers()
+    serve_receiver(config["receiver"], options["subscriber_port"])
+    subscriber.setup_subscription()
+    for file_path in glob.glob(os.path.join(options["folder"], "*.csv")):
+        room, context = os.path.basename(file_path).replace(".csv", "").split("_", 1)
+        real_time_data_simulator.create_entity_if_absent(room, context)
+
+    started = time.monotonic()
+    result, load_elapsed = asyncio.run(load_generator.run_load(options["rate"], options["concurrency"],
+                                                               options["duration"], config["sender_batch"],
+                                                               options["folder"]))
+    drained = wait_for_drain(orion, options["drain_timeout"])
+    elapsed = time.monotonic() - started
+    subscriber.trace_log.close()
+
+    import trace_report
+    latencies = trace_report.stage_latencies(first_writes(trace_report.load_traces(trace_path)))
+    shutil.rmtree(workdir, ignore_errors=True)
+    readings = len(latencies["end_to_end"])
+    return {
+        "stats": benchmark.summarize(latencies["end_to_end"]),
+        "queue_wait_stats": benchmark.summarize(latencies["queue_wait"]),
+        "hbase_write_stats": benchmark.summarize(latencies["hbase_write"]),
+        "orion_notification_stats": benchmark.summarize(latencies["orion_notification"]),
+        "request_stats": benchmark.summarize([x * 1000 for x in result.latencies]),
+        "rows": readings,
+        "bytes": 0,
+        "config": config,
+        "sent_updates": result.updates,
+        "sent_rate": result.updates / load_elapsed if load_elapsed > 0 else 0.0,
+        "ingest_rate": readings / elapsed if elapsed > 0 else 0.0,
+        "hbase": dict(hbase.stats),
+        "orion": dict(orion.stats),
+        "statuses": {str(k): v for k, v in result.statuses.items()},
+        "drained": drained,
+    }
+
+def print_result(name, r):
+    print(f"📊 {name}: sent {r['sent_rate']:,.0f} updates/s, ingested {r['rows']} readings "
+          f"({r['ingest_rate']:,.0f}/s) in {r['hbase']['rpcs']} HBase RPCs"
+          + ("" if r["drained"] else " ⚠️ not drained"))
+    print(f"   ⏱️ end-to-end:  {benchmark.format_stats(r['stats'], 'ms')}")
+    print(f"   ⏱️ queue wait:  {benchmark.format_stats(r['queue_wait_stats'], 'ms')}")
+    print(f"   ⏱️ hbase write: {benchmark.format_stats(r['hbase_write_stats'], 'ms')}")
+    print(f"   status codes: {r['statuses']} | notifications: {r['orion']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline simulator -> Orion-LD -> subscriber -> HBase benchmark "
+                                                 "against in-process fakes; every list option adds a grid axis")
+    parser.add_argument("--receiver", type=parse_list(str), default=["flask"], help=f"any of {RECEIVERS}")
+    parser.add_argument("--writers", type=parse_list(int), default=[3], help="hbase_writer threads, e.g. 1,3,8")
+    parser.add_argument("--write-batch", type=parse_list(int), default=[500], help="max entities per HBase batch")
+    parser.add_argument("--put-latency-ms", type=parse_list(float), default=[1.0],
+                        help="simulated round trip of every HBase mutation RPC")
+    parser.add_argument("--sender-batch", type=parse_list(int), default=[1],
+                        help="updates per Orion-LD request: 1 sends PATCH /attrs, more uses entityOperations/upsert")
+    parser.add_argument("--row-latency-us", type=float, default=5.0, help="simulated cost of every row in an RPC")
+    parser.add_argument("--rate", type=float, default=1000.0, help="target aggregate updates/sec")
+    parser.add_argument("--concurrency", type=int, default=32, help="max in-flight Orion-LD requests")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to generate load per configuration")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="max seconds to wait for the pipeline to empty after the load stops")
+    parser.add_argument("--wal", action="store_true", help="run the subscriber with a WAL in a temp directory")
+    parser.add_argument("--table-config", help="pre-split the fake tables as this subscriber --table-config would")
+    parser.add_argument("--folder", default="./Measurements")
+    parser.add_argument("--orion-port", type=int, default=fakes.ORION_EMULATOR_PORT)
+    parser.add_argument("--subscriber-port", type=int, default=SUBSCRIBER_PORT)
+    parser.add_argument("--output", help="write the results as .json or .csv (comparable with benchmark.py)")
+    args = parser.parse_args()
+
+    unknown = set(args.receiver) - set(RECEIVERS)
+    if unknown:
+        parser.error(f"unknown receiver(s): {', '.join(sorted(unknown))}")
+    options = {"row_latency_us": args.row_latency_us, "rate": args.rate, "concurrency": args.concurrency,
+               "duration": args.duration, "drain_timeout": args.drain_timeout, "wal": args.wal,
+               "table_config": args.table_config,
+               "folder": args.folder, "orion_port": args.orion_port, "subscriber_port": args.subscriber_port}
+    grid = [dict(zip(("receiver", "writers", "write_batch", "put_latency_ms", "sender_batch"), values))
+            for values in itertools.product(args.receiver, args.writers, args.write_batch, args.put_latency_ms,
+                                            args.sender_batch)]
+
+    results = {"queries": {}, "meta": benchmark.run_metadata(rate=args.rate, concurrency=args.concurrency,
+                                                            duration=args.duration, wal=args.wal,
+                                                            row_latency_us=args.row_latency_us)}
+    for config in grid:
+        name = configuration_name(config)
+        print(f"🚀 {name}")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                results["queries"][name] = executor.submit(run_configuration, config, options).result()
+            except Exception as e:
+                print(f"❌ {name} failed: {e}")
+                continue
+        print_result(name, results["queries"][name])
+
+    if args.output:
+        benchmark.write_results(args.output, results)
+        print(f"💾 Results written to {args.output}")
@@ -0,0 +1,147 @@
+import os
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import happybase
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dateutil import tz
+
+import hive
+from codec import decode_many
+from rowkey import get_codec, CODECS, ROWKEY_CODEC
+from watermark import ensure_watermark_table, advance_watermarks
+
+HBASE_HOST = "localhost"
+EXPORT_DIR = "./parquet"
+EXPORT_WORKERS = 4
+SCAN_BATCH_SIZE = 5000
+CHUNK_ROWS = 500000
+
+COLUMNS = [b'cf:entity', b'cf:temperature', b'cf:humidity', b'cf:brightness', b'cf:timestamp']
+SCHEMA = pa.schema([
+    ("entityid", pa.string()),
+    ("temperature", pa.float64()),
+    ("humidity", pa.int32()),
+    ("brightness", pa.float64()),
+    ("ts", pa.timestamp("ms")),
+])
+
+def init_worker(host):
+    global worker_connection
+    worker_connection = happybase.Connection(host)
+
+def decode(values):
+    return pd.Series(values, dtype=object).str.decode("utf-8")
+
+def local_times(cells):
+    # Epoch millis back to the naive local wall-clock time the Hive views expose as ts
+    millis = pd.Series(decode_many("BIGINT", cells))
+    return pd.to_datetime(millis, unit="ms", utc=True).dt.tz_convert(tz.tzlocal()).dt.tz_localize(None)
+
+def to_frame(cells):
+    # cells: one tuple of raw HBase values (or None) per row, in COLUMNS order
+    entity, temperature, humidity, brightness, timestamp = (list(column) for column in zip(*cells))
+    frame = pd.DataFrame({
+        "entityid": decode(entity),
+        "temperature": decode_many("DOUBLE", temperature),
+        "humidity": pd.Series(decode_many("INT", humidity)).astype("Int32"),
+        "brightness": decode_many("DOUBLE", brightness),
+        "ts": local_times(timestamp).astype("datetime64[ms]"),
+    })
+    return frame[frame["ts"].notna()]
+
+def write_chunk(cells, room, output_dir, part):
+    frame = to_frame(cells)
+    files = 0
+    for dt, group in frame.groupby(frame["ts"].dt.strftime("%Y-%m-%d")):
+        directory = os.path.join(output_dir, f"room={room}", f"dt={dt}")
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pandas(group, schema=SCHEMA, preserve_index=False)
+        # INT96 timestamps are what every Hive version reads back as TIMESTAMP
+        pq.write_table(table, os.path.join(directory, f"{part}.parquet"), compression="snappy",
+                       use_deprecated_int96_timestamps=True)
+        files += 1
+    return len(frame), files
+
+def export_range(table_name, part, row_start, row_stop, output_dir, batch_size=SCAN_BATCH_SIZE,
+                 chunk_rows=CHUNK_ROWS):
+    started = time.perf_counter()
+    room = table_name[:-len("_data")]
+    table = worker_connection.table(table_name.encode())
+    rows, files, chunk, cells = 0, 0, 0, []
+    for _, data in table.scan(row_start=row_start, row_stop=row_stop, columns=COLUMNS, batch_size=batch_size):
+        cells.append(tuple(data.get(column) for column in COLUMNS))
+        if len(cells) >= chunk_rows:
+            written, written_files = write_chunk(cells, room, output_dir, f"{part}-{chunk:04d}")
+            rows, files, chunk, cells = rows + written, files + written_files, chunk + 1, []
+    if cells:
+        written, written_files = write_chunk(cells, room, output_dir, f"{part}-{chunk:04d}")
+        rows, files = rows + written, files + written_files
+    return rows, files, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the *_data HBase tables to partitioned Parquet for Hive")
+    parser.add_argument("--table", action="append", help="table to export (repeatable, default: all)")
+    parser.add_argument("--output", default=EXPORT_DIR, help="root directory of the room=/dt= partitions")
+    parser.add_argument("--location", help="Hive LOCATION of the output (default: file:// URI of --output)")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS,
+                        help="worker processes, each scanning one key range at a time")
+    parser.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE, help="rows per Thrift scanner call")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="max rows held per key range before writing")
+    parser.add_argument("--codec", default=ROWKEY_CODEC, choices=sorted(CODECS), help="row key layout of the tables")
+    parser.add_argument("--host", default=HBASE_HOST)
+    parser.add_argument("--hive-host", default=hive.HIVE_HOST)
+    parser.add_argument("--hive-port", type=int, default=hive.HIVE_PORT)
+    parser.add_argument("--suffix", default=hive.PARQUET_SUFFIX, help="suffix of the per-room Hive views")
+    parser.add_argument("--skip-hive", action="store_true", help="only write the Parquet files")
+    args = parser.parse_args()
+
+    table_names = args.table or list(hive.tables)
+    codec = get_codec(args.codec)
+    for table_name in table_names:
+        shutil.rmtree(os.path.join(args.output, f"room={table_name[:-len('_data')]}"), ignore_errors=True)
+
+    # Salted keys give one independent range per bucket, so every table is scanned by several workers at once
+    ranges = [(table_name, f"{table_name}-b{i:02d}", row_start, row_stop)
+              for table_name in table_names for i, (row_start, row_stop) in enumerate(codec.key_ranges())]
+    started = time.perf_counter()
+    total_rows, total_files = 0, 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.host,)) as executor:
+        futures = {executor.submit(export_range, table_name, part, row_start, row_stop, args.output,
+                                   args.batch_size, args.chunk_rows): part
+                   for table_name, part, row_start, row_stop in ranges}
+        for future in as_completed(futures):
+            try:
+                rows, files, elapsed = future.result()
+                total_rows += rows
+                total_files += files
+                print(f"✅ {futures[future]}: {rows} rows, {files} files in {elapsed:.2f}s")
+            except Exception as e:
+                print(f"❌ Failed to export {futures[future]}: {e}")
+    wall = time.perf_counter() - started
+    if wall > 0:
+        print(f"📊 Exported {total_rows} rows into {total_files} Parquet files in {wall:.2f}s "
+              f"({total_rows / wall:,.0f} rows/sec, {args.workers} worker)")
+
+    if not args.skip_hive:
+        conn = hive.connect(args.hive_host, args.hive_port)
+        cursor = conn.cursor()
+        hive.create_parquet_tables(cursor, args.location or f"file://{os.path.abspath(args.output)}", args.suffix)
+        cursor.close()
+        conn.close()
+
+    try:
+        # The partitions were rewritten: invalidates results cached by hive.py --cache --table-suffix
+        connection = happybase.Connection(args.host)
+        ensure_watermark_table(connection)
+        advance_watermarks(connection, [table_name + args.suffix for table_name in table_names])
+        connection.close()
+    except Exception as e:
+        print(f"❌ Failed to advance the ingest watermarks of the {args.suffix} tables: {e}")
+
+if __name__ == "__main__":
+    main()
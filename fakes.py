@@ -0,0 +1,380 @@
+import time
+import uuid
+import bisect
+import asyncio
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import aiohttp
+import happybase
+from aiohttp import web
+
+from codec import LONG
+
+# In-process stand-ins for the docker stack (aio-compose.yaml): an in-memory HBase behind the happybase API and
+# a minimal Orion-LD that stores entities and sends subscription notifications. Used by e2e_benchmark.py.
+
+ORION_EMULATOR_PORT = 11026
+NOTIFY_CONCURRENCY = 32
+
+def _name(name):
+    return name.decode() if isinstance(name, bytes) else name
+
+def _select(data, columns):
+    if not columns:
+        return dict(data)
+    wanted = [c if isinstance(c, bytes) else c.encode() for c in columns]
+    return {col: value for col, value in data.items()
+            if any(col == c or (b":" not in c and col.startswith(c + b":")) for c in wanted)}
+
+class FakeHBase:
+    # Sorted in-memory tables. Every mutation RPC (put, batch send, counter) sleeps rpc_latency plus row_latency per
+    # row outside the lock, so concurrent writers overlap the way they would against a Thrift server.
+    def __init__(self, rpc_latency=0.0, row_latency=0.0):
+        self.rpc_latency = rpc_latency
+        self.row_latency = row_latency
+        self.lock = threading.Lock()
+        self.tables = {}
+        # table name -> region start keys, as a pre-split table would report them
+        self.split_keys = {}
+        self.stats = {"rpcs": 0, "puts": 0}
+
+    def rpc(self, rows=1):
+        delay = self.rpc_latency + self.row_latency * rows
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            self.stats["rpcs"] += 1
+
+    def create(self, name):
+        with self.lock:
+            if name in self.tables:
+                raise Exception(f"TableExistsException: {name}")
+            self.tables[name] = ([], {})
+
+    def drop(self, name):
+        with self.lock:
+            self.tables.pop(name, None)
+
+    def apply(self, name, mutations):
+        # mutations: (rowkey, data) puts or (rowkey, None) deletes
+        with self.lock:
+            keys, rows = self.tables[name]
+            for rowkey, data in mutations:
+                if data is None:
+                    if rows.pop(rowkey, None) is not None:
+                        del keys[bisect.bisect_left(keys, rowkey)]
+                    continue
+                if rowkey not in rows:
+                    bisect.insort(keys, rowkey)
+                    rows[rowkey] = {}
+                rows[rowkey].update(data)
+                self.stats["puts"] += 1
+
+    def row_count(self, name):
+        with self.lock:
+            return len(self.tables.get(name, ([], {}))[0])
+
+class FakeBatch:
+    def __init__(self, table, batch_size=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.mutations = []
+
+    def put(self, row, data, wal=None):
+        self.mutations.append((row, data))
+        if self.batch_size and len(self.mutations) >= self.batch_size:
+            self.send()
+
+    def delete(self, row, columns=None, wal=None):
+        self.mutations.append((row, None))
+        if self.batch_size and len(self.mutations) >= self.batch_size:
+            self.send()
+
+    def send(self):
+        if self.mutations:
+            mutations, self.mutations = self.mutations, []
+            self.table.hbase.rpc(len(mutations))
+            self.table.hbase.apply(self.table.name, mutations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # happybase only sends the pending mutations when the block exits cleanly
+        if exc_type is None:
+            self.send()
+
+class FakeTable:
+    def __init__(self, hbase, name):
+        self.hbase = hbase
+        self.name = name
+
+    def put(self, row, data, timestamp=None, wal=True):
+        self.hbase.rpc()
+        self.hbase.apply(self.name, [(row, data)])
+
+    def delete(self, row, columns=None, timestamp=None, wal=True):
+        self.hbase.rpc()
+        self.hbase.apply(self.name, [(row, None)])
+
+    def batch(self, timestamp=None, batch_size=None, transaction=False, wal=True):
+        return FakeBatch(self, batch_size)
+
+    def row(self, row, columns=None, timestamp=None, include_timestamp=False):
+        with self.hbase.lock:
+            return _select(self.hbase.tables[self.name][1].get(row, {}), columns)
+
+    def rows(self, rows, columns=None, timestamp=None, include_timestamp=False):
+        with self.hbase.lock:
+            stored = self.hbase.tables[self.name][1]
+            return [(row, _select(stored[row], columns)) for row in rows if row in stored]
+
+    def scan(self, row_start=None, row_stop=None, row_prefix=None, columns=None, filter=None, timestamp=None,
+             include_timestamp=False, batch_size=1000, scan_batching=None, limit=None, sorted_columns=False,
+             reverse=False):
+        if row_prefix is not None:
+            row_start, row_stop = row_prefix, row_prefix + b"\xff"
+        with self.hbase.lock:
+            keys, stored = self.hbase.tables[self.name]
+            lo = bisect.bisect_left(keys, row_start) if row_start else 0
+            hi = bisect.bisect_left(keys, row_stop) if row_stop else len(keys)
+            selected = [(key, _select(stored[key], columns)) for key in keys[lo:hi]]
+        if reverse:
+            selected.reverse()
+        yield from selected[:limit] if limit else selected
+
+    def regions(self):
+        bounds = [b""] + sorted(self.hbase.split_keys.get(self.name, [])) + [b""]
+        return [{"start_key": start, "end_key": end, "id": i, "name": f"{self.name},{i}".encode(), "version": 1,
+                 "server_name": b"localhost", "port": 16020} for i, (start, end) in enumerate(zip(bounds, bounds[1:]))]
+
+    def counter_inc(self, row, column, value=1):
+        self.hbase.rpc()
+        with self.hbase.lock:
+            keys, stored = self.hbase.tables[self.name]
+            if row not in stored:
+                bisect.insort(keys, row)
+                stored[row] = {}
+            current = LONG.unpack(stored[row][column])[0] if column in stored[row] else 0
+            stored[row][column] = LONG.pack(current + value)
+            return current + value
+
+    def counter_get(self, row, column):
+        return self.counter_inc(row, column, 0)
+
+class FakeConnection:
+    def __init__(self, hbase):
+        self.hbase = hbase
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def tables(self):
+        with self.hbase.lock:
+            return [name.encode() for name in self.hbase.tables]
+
+    def create_table(self, name, families):
+        self.hbase.create(_name(name))
+
+    def delete_table(self, name, disable=False):
+        self.hbase.drop(_name(name))
+
+    def disable_table(self, name):
+        pass
+
+    def enable_table(self, name):
+        pass
+
+    def is_table_enabled(self, name):
+        return True
+
+    def table(self, name, use_prefix=True):
+        return FakeTable(self.hbase, _name(name))
+
+class FakeConnectionPool:
+    def __init__(self, size, hbase):
+        self.connections = [FakeConnection(hbase) for _ in range(size)]
+        self.available = threading.Semaphore(size)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        if not self.available.acquire(timeout=timeout):
+            raise happybase.NoConnectionsAvailable("No connection available from pool within specified timeout")
+        with self.lock:
+            connection = self.connections.pop()
+        try:
+            yield connection
+        finally:
+            with self.lock:
+                self.connections.append(connection)
+            self.available.release()
+
+def install_fake_hbase(hbase):
+    # Every happybase.Connection/ConnectionPool created afterwards, in any module, talks to `hbase`
+    happybase.Connection = lambda host=None, port=None, **kwargs: FakeConnection(hbase)
+    happybase.ConnectionPool = lambda size, **kwargs: FakeConnectionPool(size, hbase)
+    return hbase
+
+def serve_in_thread(app, host, port):
+    # Runs an aiohttp application on its own event loop thread; returns the loop
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop
+
+class OrionEmulator:
+    # Just enough NGSI-LD for the simulator, the load generator and the subscriber: entity create/read, PATCH and
+    # POST /attrs, entityOperations upsert/update, and subscriptions notifying one entity per update
+    def __init__(self, host="127.0.0.1", port=ORION_EMULATOR_PORT, notify_concurrency=NOTIFY_CONCURRENCY):
+        self.host, self.port = host, port
+        self.notify_concurrency = notify_concurrency
+        self.entities = {}
+        self.subscriptions = {}
+        self.stats = {"updates": 0, "notifications": 0, "notify_errors": 0}
+        self.loop = None
+        self.outbox = None
+        self.inflight = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/ngsi-ld/v1"
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/ngsi-ld/v1/subscriptions", self.create_subscription)
+        app.router.add_delete("/ngsi-ld/v1/subscriptions/{id}", self.delete_subscription)
+        app.router.add_post("/ngsi-ld/v1/entities/", self.create_entity)
+        app.router.add_post("/ngsi-ld/v1/entities", self.create_entity)
+        app.router.add_get("/ngsi-ld/v1/entities/{id}", self.get_entity)
+        app.router.add_patch("/ngsi-ld/v1/entities/{id}/attrs", self.update_attrs)
+        app.router.add_post("/ngsi-ld/v1/entities/{id}/attrs", self.update_attrs)
+        app.router.add_post("/ngsi-ld/v1/entityOperations/upsert", self.upsert)
+        app.router.add_post("/ngsi-ld/v1/entityOperations/update", self.batch_update)
+        app.on_startup.append(self.start_senders)
+        return app
+
+    def start(self):
+        self.loop = serve_in_thread(self.create_app(), self.host, self.port)
+        return self
+
+    def idle(self):
+        return self.outbox is not None and self.outbox.empty() and self.inflight == 0
+
+    async def start_senders(self, app):
+        self.outbox = asyncio.Queue()
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.notify_concurrency))
+        for _ in range(self.notify_concurrency):
+            asyncio.get_running_loop().create_task(self.sender(session))
+
+    async def sender(self, session):
+        while True:
+            uri, notification = await self.outbox.get()
+            self.inflight += 1
+            try:
+                async with session.post(uri, json=notification, headers={"Content-Type": "application/json"}) as r:
+                    await r.read()
+                    if r.status >= 300:
+                        self.stats["notify_errors"] += 1
+                    self.stats["notifications"] += 1
+            except Exception:
+                self.stats["notify_errors"] += 1
+            finally:
+                self.inflight -= 1
+
+    async def create_subscription(self, request):
+        subscription = await request.json()
+        subscription.setdefault("id", f"urn:ngsi-ld:Subscription:{uuid.uuid4()}")
+        self.subscriptions[subscription["id"]] = subscription
+        return web.Response(status=201, headers={"Location": f"/ngsi-ld/v1/subscriptions/{subscription['id']}"})
+
+    async def delete_subscription(self, request):
+        if self.subscriptions.pop(request.match_info["id"], None) is None:
+            return web.json_response({"type": "ResourceNotFound"}, status=404)
+        return web.Response(status=204)
+
+    async def get_entity(self, request):
+        entity = self.entities.get(request.match_info["id"])
+        if entity is None:
+            return web.json_response({"type": "ResourceNotFound"}, status=404)
+        return web.json_response(entity)
+
+    async def create_entity(self, request):
+        fragment = await request.json()
+        if fragment["id"] in self.entities:
+            return web.json_response({"type": "AlreadyExists"}, status=409)
+        self.apply(fragment)
+        return web.Response(status=201)
+
+    async def update_attrs(self, request):
+        entity_id = request.match_info["id"]
+        if entity_id not in self.entities:
+            return web.json_response({"type": "ResourceNotFound"}, status=404)
+        self.apply(dict(await request.json(), id=entity_id))
+        return web.Response(status=204)
+
+    async def upsert(self, request):
+        fragments = await request.json()
+        created = any(fragment["id"] not in self.entities for fragment in fragments)
+        for fragment in fragments:
+            self.apply(fragment)
+        return web.json_response([f["id"] for f in fragments], status=201) if created else web.Response(status=204)
+
+    async def batch_update(self, request):
+        success, errors = [], []
+        for fragment in await request.json():
+            if fragment["id"] in self.entities:
+                self.apply(fragment)
+                success.append(fragment["id"])
+            else:
+                errors.append({"entityId": fragment["id"], "error": {"type": "ResourceNotFound", "status": 404}})
+        if not errors:
+            return web.Response(status=204)
+        return web.json_response({"success": success, "errors": errors}, status=207)
+
+    def apply(self, fragment):
+        entity_id = fragment["id"]
+        entity = self.entities.setdefault(entity_id, {"id": entity_id, "type": fragment.get("type")})
+        if fragment.get("type"):
+            entity["type"] = fragment["type"]
+        changed = [name for name in fragment if name not in ("id", "type", "@context")]
+        for name in changed:
+            entity[name] = fragment[name]
+        self.stats["updates"] += 1
+        self.notify(entity, changed)
+
+    def notify(self, entity, changed):
+        for subscription in self.subscriptions.values():
+            selectors = subscription.get("entities", [])
+            if selectors and not any(s.get("id", entity["id"]) == entity["id"] and
+                                     s.get("type", entity["type"]) == entity["type"] for s in selectors):
+                continue
+            watched = subscription.get("watchedAttributes")
+            if watched and not set(watched) & set(changed):
+                continue
+            notification = subscription.get("notification", {})
+            attributes = notification.get("attributes") or [name for name in entity if name not in ("id", "type")]
+            data = {"id": entity["id"], "type": entity["type"]}
+            data.update({name: entity[name] for name in attributes if name in entity})
+            self.outbox.put_nowait((notification["endpoint"]["uri"], {
+                "id": f"urn:ngsi-ld:Notification:{uuid.uuid4()}",
+                "type": "Notification",
+                "subscriptionId": subscription["id"],
+                "notifiedAt": datetime.now(timezone.utc).isoformat(),
+                "data": [data],
+            }))
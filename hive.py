@@ -1,22 +1,38 @@
+import os
+import re
 import sys
 import time
-import csv
-import statistics
+import queue
+import random
+import argparse
+from array import array
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pyhive import hive
 
-# Connessione a Hive
-conn = hive.Connection(host='localhost', port=10000, username='hive', database='default')
-cursor = conn.cursor()
+import benchmark
+from rollup import ROLLUP_TABLE, SENSORS
+from codec import SENSOR_TYPES, local_timezone
+from query_cache import QueryCache, QueryService, CACHE_TTL_SECONDS
+from watermark import HBaseWatermarks, HBASE_HOST, WATERMARK_FLUSH_SECONDS
 
-# Stampa versione Hive
-cursor.execute("SET -v")
-version_info = cursor.fetchall()
-print("🧠 Hive Configuration (including version):")
-for row in version_info:
-    if 'hive.execution.version' in row[0].lower() or 'version' in row[0].lower():
-        print(row[0])
+HIVE_HOST = "localhost"
+HIVE_PORT = 10000
+HIVE_USER = "hive"
+HIVE_DATABASE = "default"
+WARMUP_RUNS = 1
+ITERATIONS = 30
+FETCH_MODE = "stream"
+FETCH_ARRAYSIZE = 10000
+CONCURRENT_CLIENTS = 8
+CONCURRENT_DURATION = 60.0
+CONCURRENT_WARMUP = 5.0
+PARQUET_TABLE = "sensor_readings_parquet"
+PARQUET_SUFFIX = "_parquet"
+HBASE_SUFFIX = "_hbase"
+# Zone the ingest side formats local times in: ts is shown in it, as when it was stored as a local string
+HIVE_TIMEZONE = local_timezone()
 
-# Creazione tabelle
 tables = {
     "kitchen_data": "kitchen_data",
     "room1_data": "room1_data",
@@ -26,39 +42,20 @@ tables = {
     "toilet_data": "toilet_data"
 }
 
-for table, hbase_table in tables.items():
-    cursor.execute(f"DROP TABLE IF EXISTS {table}")
-    cursor.execute(f"""
-    CREATE EXTERNAL TABLE {table} (
-        entityid STRING,
-        temperature DOUBLE,
-        humidity INT,
-        brightness DOUBLE,
-        ts TIMESTAMP
-    )
-    STORED BY 'org.apache.hadoop.hive.hbase.HBaseStorageHandler'
-    WITH SERDEPROPERTIES (
-        "hbase.columns.mapping" = ":key,cf:temperature,cf:humidity,cf:brightness,cf:timestamp"
-    )
-    TBLPROPERTIES ("hbase.table.name" = "{hbase_table}")
-    """)
-
-print("✅ Tabelle (ri)create.")
-
 # Elenco query da eseguire
 queries = [
-    ("50_1.txt", """
+    ("50_1", """
         SELECT temperature, ts
         FROM kitchen_data
         WHERE unix_timestamp(ts) >= unix_timestamp() - 3600
     """),
-    ("50_2.txt", """
+    ("50_2", """
         SELECT hour(ts) as hour_bucket, AVG(CAST(temperature AS DOUBLE)) as avg_temp
         FROM kitchen_data
         GROUP BY hour(ts)
         ORDER BY hour_bucket
     """),
-    ("50_3.txt", """
+    ("50_3", """
 SELECT 
   tab.room,
   HOUR(tab.ts) AS hour,
@@ -81,7 +78,7 @@ FROM (
 ) tab
 GROUP BY CUBE (tab.room, HOUR(tab.ts))
     """),
-    ("50_4.txt", """
+    ("50_4", """
         SELECT r1.hour, r1.avg_temp as room1_temp, r2.avg_temp as room2_temp
         FROM (
             SELECT hour(ts) as hour, AVG(CAST(temperature AS DOUBLE)) as avg_temp
@@ -95,47 +92,511 @@ GROUP BY CUBE (tab.room, HOUR(tab.ts))
         ) r2
         ON r1.hour = r2.hour
 
-""")
+"""),
+    # Same aggregations served from the hourly rollups maintained at ingest time. The rollups keep no row count,
+    # so 50_3_rollup reports sensor_readings (up to three per row) where 50_3 reports COUNT(*) rows
+    ("50_2_rollup", """
+        SELECT CAST(substr(hour, 12, 2) AS INT) as hour_bucket,
+               SUM(temperature_sum) / 1000.0 / SUM(temperature_count) as avg_temp
+        FROM hourly_rollup
+        WHERE rowkey >= 'kitchen_' AND rowkey < 'kitchen`'
+        GROUP BY CAST(substr(hour, 12, 2) AS INT)
+        ORDER BY hour_bucket
+    """),
+    ("50_3_rollup", """
+        SELECT
+          room,
+          CAST(substr(hour, 12, 2) AS INT) AS hour,
+          SUM(temperature_sum) / 1000.0 / SUM(temperature_count) AS avg_temperature,
+          MIN(humidity_min) AS min_humidity,
+          MAX(brightness_max) AS max_brightness,
+          SUM(COALESCE(temperature_count, 0) + COALESCE(humidity_count, 0) + COALESCE(brightness_count, 0))
+            AS sensor_readings
+        FROM hourly_rollup
+        GROUP BY CUBE (room, CAST(substr(hour, 12, 2) AS INT))
+    """),
+    ("50_4_rollup", """
+        SELECT r1.hour, r1.avg_temp as room1_temp, r2.avg_temp as room2_temp
+        FROM (
+            SELECT CAST(substr(hour, 12, 2) AS INT) as hour, SUM(temperature_sum) / 1000.0 / SUM(temperature_count) as avg_temp
+            FROM hourly_rollup
+            WHERE rowkey >= 'room1_' AND rowkey < 'room1`'
+            GROUP BY CAST(substr(hour, 12, 2) AS INT)
+        ) r1
+        JOIN (
+            SELECT CAST(substr(hour, 12, 2) AS INT) as hour, SUM(temperature_sum) / 1000.0 / SUM(temperature_count) as avg_temp
+            FROM hourly_rollup
+            WHERE rowkey >= 'room2_' AND rowkey < 'room2`'
+            GROUP BY CAST(substr(hour, 12, 2) AS INT)
+        ) r2
+        ON r1.hour = r2.hour
+    """)
 ]
 
-# Argomento da terminale
-args = sys.argv[1:] if len(sys.argv) > 1 else []
-selected = args[0] if args else "--all"
+QUERIES = {}
+
+def register_query(name, sql):
+    QUERIES[name] = sql
+
+for name, sql in queries:
+    register_query(name, sql)
+
+def connect(host=HIVE_HOST, port=HIVE_PORT):
+    # Connessione a Hive
+    return hive.Connection(host=host, port=port, username=HIVE_USER, database=HIVE_DATABASE)
+
+class HiveConnectionPool:
+    # Connections are opened up front so connect time is not counted as query latency
+    def __init__(self, size, host=HIVE_HOST, port=HIVE_PORT, cache=None, watermarks=None):
+        self.host, self.port = host, port
+        self.cache, self.watermarks = cache, watermarks
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(connect(host, port))
+
+    @contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        except Exception:
+            # A failed HiveServer2 session may be unusable: hand back a fresh one instead
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = connect(self.host, self.port)
+            raise
+        finally:
+            self.connections.put(conn)
+
+    def cursor(self, conn):
+        if self.cache is None:
+            return conn.cursor()
+        return QueryService(conn, self.cache, self.watermarks).cursor()
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+def make_cache(args, spill_suffix=""):
+    if not args.cache:
+        return None, None
+    spill_dir = os.path.join(args.cache_spill_dir, spill_suffix) if args.cache_spill_dir and spill_suffix \
+        else args.cache_spill_dir
+    return (QueryCache(ttl=args.cache_ttl, spill_dir=spill_dir),
+            HBaseWatermarks(args.hbase_host, args.watermark_poll))
+
+def print_version(cursor):
+    # Stampa versione Hive
+    cursor.execute("SET -v")
+    version_info = cursor.fetchall()
+    print("🧠 Hive Configuration (including version):")
+    for row in version_info:
+        if 'hive.execution.version' in row[0].lower() or 'version' in row[0].lower():
+            print(row[0])
+
+def drop_table_or_view(cursor, name):
+    # Older runs created the *_data names as tables, newer ones as views
+    for statement in (f"DROP VIEW IF EXISTS {name}", f"DROP TABLE IF EXISTS {name}"):
+        try:
+            cursor.execute(statement)
+        except Exception:
+            pass
 
-for filename, sql in queries:
-    if selected != "--all" and selected != filename:
-        continue
+def create_tables(cursor, timezone=HIVE_TIMEZONE):
+    # Creazione tabelle
+    # Sensor cells and the timestamp are fixed-width binary (codec.py), mapped with #b so the storage handler
+    # decodes them directly instead of parsing strings. A view under the original name turns the epoch millis
+    # into the local ts the queries use.
+    sensor_columns = ",\n            ".join(f"{sensor} {kind}" for sensor, kind in SENSOR_TYPES.items())
+    sensor_mapping = ",".join(f"cf:{sensor}#b" for sensor in SENSOR_TYPES)
+    for table, hbase_table in tables.items():
+        drop_table_or_view(cursor, table)
+        cursor.execute(f"DROP TABLE IF EXISTS {table}{HBASE_SUFFIX}")
+        cursor.execute(f"""
+        CREATE EXTERNAL TABLE {table}{HBASE_SUFFIX} (
+            rowkey BINARY,
+            entityid STRING,
+            {sensor_columns},
+            ts_millis BIGINT
+        )
+        STORED BY 'org.apache.hadoop.hive.hbase.HBaseStorageHandler'
+        WITH SERDEPROPERTIES (
+            "hbase.columns.mapping" = ":key,cf:entity,{sensor_mapping},cf:timestamp#b"
+        )
+        TBLPROPERTIES ("hbase.table.name" = "{hbase_table}")
+        """)
+        cursor.execute(f"""
+        CREATE VIEW {table} AS
+        SELECT rowkey, entityid, {", ".join(SENSOR_TYPES)},
+               from_utc_timestamp(ts_millis, '{timezone}') AS ts, ts_millis
+        FROM {table}{HBASE_SUFFIX}
+        """)
 
-    print(f"\n🚀 Running query from {filename}...")
-    times = []
+    cursor.execute(f"DROP TABLE IF EXISTS {ROLLUP_TABLE}")
+    cursor.execute(f"""
+    CREATE EXTERNAL TABLE {ROLLUP_TABLE} (
+        rowkey STRING,
+        room STRING,
+        hour STRING,
+        {", ".join(f"{s}_count BIGINT, {s}_sum BIGINT, {s}_min DOUBLE, {s}_max DOUBLE" for s in SENSORS)}
+    )
+    STORED BY 'org.apache.hadoop.hive.hbase.HBaseStorageHandler'
+    WITH SERDEPROPERTIES (
+        "hbase.columns.mapping" = ":key,cf:room,cf:hour,{",".join(
+            f"cf:{s}_count#b,cf:{s}_sum#b,cf:{s}_min#b,cf:{s}_max#b" for s in SENSORS)}"
+    )
+    TBLPROPERTIES ("hbase.table.name" = "{ROLLUP_TABLE}")
+    """)
 
-    # warmup
-    warmup = time.time()
+    print("✅ Tabelle (ri)create.")
+
+def create_parquet_tables(cursor, location, suffix=PARQUET_SUFFIX):
+    # One Parquet table partitioned by room and day (written by export.py), plus a view per room named like the
+    # HBase-backed table with `suffix`, so the same queries can run against either copy
+    cursor.execute(f"DROP TABLE IF EXISTS {PARQUET_TABLE}")
+    cursor.execute(f"""
+    CREATE EXTERNAL TABLE {PARQUET_TABLE} (
+        entityid STRING,
+        temperature DOUBLE,
+        humidity INT,
+        brightness DOUBLE,
+        ts TIMESTAMP
+    )
+    PARTITIONED BY (room STRING, dt STRING)
+    STORED AS PARQUET
+    LOCATION '{location}'
+    """)
+    cursor.execute(f"MSCK REPAIR TABLE {PARQUET_TABLE}")
+    for table in tables:
+        room = table[:-len("_data")]
+        cursor.execute(f"DROP VIEW IF EXISTS {table}{suffix}")
+        cursor.execute(f"""
+        CREATE VIEW {table}{suffix} AS
+        SELECT entityid, temperature, humidity, brightness, ts
+        FROM {PARQUET_TABLE}
+        WHERE room = '{room}'
+        """)
+    print(f"✅ Tabelle Parquet (ri)create su {location}.")
+
+def with_table_suffix(sql, suffix):
+    # e.g. kitchen_data -> kitchen_data_parquet
+    if not suffix:
+        return sql
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, tables)) + r")\b")
+    return pattern.sub(lambda m: m.group(1) + suffix, sql)
+
+def result_size(rows):
+    return sum(len(cell) if isinstance(cell, (str, bytes)) else len(str(cell)) for row in rows for cell in row)
+
+def iter_batches(cursor, arraysize=FETCH_ARRAYSIZE):
+    cursor.arraysize = arraysize
+    while True:
+        batch = cursor.fetchmany(arraysize)
+        if not batch:
+            return
+        yield batch
+
+class ColumnBuffers:
+    # Numeric Hive columns go into compact typed arrays instead of per-row tuples
+    TYPECODES = {
+        "DOUBLE_TYPE": "d", "FLOAT_TYPE": "d", "DECIMAL_TYPE": "d",
+        "BIGINT_TYPE": "q", "INT_TYPE": "q", "SMALLINT_TYPE": "q", "TINYINT_TYPE": "q",
+    }
+
+    def __init__(self, description):
+        self.names = [col[0] for col in description]
+        self.columns = [array(self.TYPECODES[col[1]]) if col[1] in self.TYPECODES else [] for col in description]
+
+    def extend(self, batch):
+        for i, values in enumerate(zip(*batch)):
+            column = self.columns[i]
+            if isinstance(column, array):
+                if column.typecode == "d":
+                    values = [float("nan") if v is None else v for v in values]
+                elif None in values:
+                    # Integer arrays cannot hold NULLs: fall back to a plain list for this column
+                    column = self.columns[i] = column.tolist()
+                column.extend(values)
+            else:
+                column.extend(values)
+
+def run_query(cursor, sql, fetch=FETCH_MODE, arraysize=FETCH_ARRAYSIZE):
+    start = time.perf_counter()
     cursor.execute(sql)
-    cursor.fetchall()
-    warmup_duration = time.time() - warmup
-    times.append(warmup_duration)
-
-    for _ in range(30):
-        start = time.time()
-        cursor.execute(sql)
-        cursor.fetchall()
-        end = time.time()
-        times.append(end - start)
-
-    mean = statistics.mean(times[1:])
-    stdev = statistics.stdev(times[1:])
-    conf = 1.96 * stdev / (len(times[1:]) ** 0.5)
-
-    with open(filename, "w") as f:
-        f.write(f"Warm-up: {times[0]:.6f} sec\n")
-        for i, t in enumerate(times[1:], 1):
-            f.write(f"Run {i}: {t:.6f} sec\n")
-        f.write(f"\nMedia: {mean:.6f} sec\n")
-        f.write(f"Deviazione standard: {stdev:.6f} sec\n")
-        f.write(f"Intervallo 95%: ±{conf:.6f} sec\n")
-
-    print(f"✅ Query {filename} completata e salvata.")
-
-cursor.close()
-conn.close()
+    batches = [cursor.fetchall()] if fetch == "all" else iter_batches(cursor, arraysize)
+    buffers = ColumnBuffers(cursor.description or []) if fetch == "columnar" else None
+
+    first_row, rows, size, sizing = None, 0, 0, 0.0
+    for batch in batches:
+        if first_row is None and batch:
+            first_row = time.perf_counter() - start
+        rows += len(batch)
+        # The byte count str()s every cell, so its own time is left out of elapsed
+        sized = time.perf_counter()
+        size += result_size(batch)
+        sizing += time.perf_counter() - sized
+        if buffers is not None:
+            buffers.extend(batch)
+    elapsed = time.perf_counter() - start - sizing
+    return {"elapsed": elapsed, "first_row": elapsed if first_row is None else first_row,
+            "rows": rows, "bytes": size}
+
+def benchmark_query(cursor, name, sql, warmup=WARMUP_RUNS, iterations=ITERATIONS,
+                    fetch=FETCH_MODE, arraysize=FETCH_ARRAYSIZE):
+    print(f"\n🚀 Running query {name} ({warmup} warm-up, {iterations} runs, fetch={fetch})...")
+    warmup_times = [run_query(cursor, sql, fetch, arraysize)["elapsed"] for _ in range(warmup)]
+
+    times, first_rows, run = [], [], {"rows": 0, "bytes": 0}
+    for _ in range(iterations):
+        run = run_query(cursor, sql, fetch, arraysize)
+        times.append(run["elapsed"])
+        first_rows.append(run["first_row"])
+
+    stats = benchmark.summarize(times)
+    first_row_stats = benchmark.summarize(first_rows)
+    print(f"✅ {name}: {benchmark.format_stats(stats)} | {run['rows']} rows, {run['bytes']} bytes")
+    print(f"   ⏱️ time to first row: {benchmark.format_stats(first_row_stats)}")
+    return {"sql": sql.strip(), "warmup": warmup_times, "samples": times, "stats": stats,
+            "first_row_samples": first_rows, "first_row_stats": first_row_stats,
+            "rows": run["rows"], "bytes": run["bytes"]}
+
+def run_benchmarks(args):
+    conn = connect(args.host, args.port)
+    cursor = conn.cursor()
+    print_version(cursor)
+    if not args.skip_ddl:
+        create_tables(cursor)
+    cache, watermarks = make_cache(args)
+    if cache is not None:
+        cursor.close()
+        cursor = QueryService(conn, cache, watermarks).cursor()
+
+    selected = args.query or list(QUERIES)
+    unknown = [name for name in selected if name not in QUERIES]
+    if unknown:
+        print(f"❌ Unknown queries: {', '.join(unknown)} (available: {', '.join(QUERIES)})")
+        return 2
+
+    results = {"meta": benchmark.run_metadata(hive_host=args.host, warmup=args.warmup,
+                                              iterations=args.iterations, fetch=args.fetch,
+                                              arraysize=args.arraysize, cache=args.cache,
+                                              table_suffix=args.table_suffix),
+               "queries": {}}
+    for name in selected:
+        sql = with_table_suffix(QUERIES[name], args.table_suffix)
+        results["queries"][name] = benchmark_query(cursor, name, sql, args.warmup, args.iterations,
+                                                   args.fetch, args.arraysize)
+
+    cursor.close()
+    conn.close()
+    if cache is not None:
+        print(f"🗃️ Query cache: {cache.stats}")
+        watermarks.close()
+
+    benchmark.write_results(args.output, results)
+    print(f"💾 Results written to {args.output}")
+    return 0
+
+def parse_mix(selected, weights):
+    # --mix 50_1=3 --mix 50_2=1 ; queries without a weight get 1
+    mix = {name: 1.0 for name in selected}
+    for item in weights or []:
+        name, _, weight = item.partition("=")
+        mix[name] = float(weight or 1)
+    return mix
+
+def run_client(pool, client_id, mix, sqls, started, deadline, warmup, fetch, arraysize):
+    # Runs queries drawn from the mix until the deadline; samples that start during warm-up are discarded
+    rng = random.Random(client_id)
+    names, weights = list(mix), list(mix.values())
+    samples, errors = [], 0
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        issued = time.time()
+        try:
+            with pool.connection() as conn:
+                cursor = pool.cursor(conn)
+                try:
+                    run = run_query(cursor, sqls[name], fetch, arraysize)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"❌ [client {client_id}] {name} failed: {e}")
+            errors += 1
+            continue
+        if issued - started >= warmup:
+            samples.append((name, issued, run["elapsed"], run["rows"], run["bytes"]))
+    return samples, errors
+
+def init_client(args):
+    global client_pool
+    cache, watermarks = make_cache(args, str(os.getpid()))
+    client_pool = HiveConnectionPool(1, args.host, args.port, cache, watermarks)
+
+def run_process_client(client_id, mix, sqls, started, deadline, warmup, fetch, arraysize):
+    return run_client(client_pool, client_id, mix, sqls, started, deadline, warmup, fetch, arraysize)
+
+def concurrent_report(samples, errors, window, clients):
+    results = {}
+    by_query = {}
+    for name, _, elapsed, rows, size in samples:
+        by_query.setdefault(name, []).append((elapsed, rows, size))
+    for name, runs in sorted(by_query.items()):
+        stats = benchmark.summarize([elapsed for elapsed, _, _ in runs])
+        qps = len(runs) / window
+        print(f"✅ {name}: {qps:.2f} q/s | {benchmark.format_stats(stats)}")
+        results[name] = {"stats": stats, "count": len(runs), "qps": qps,
+                         "rows": runs[-1][1], "bytes": runs[-1][2]}
+
+    overall = benchmark.summarize([elapsed for _, _, elapsed, _, _ in samples])
+    qps = len(samples) / window
+    print(f"📊 {clients} clients: {qps:.2f} queries/sec over {window:.1f}s ({len(samples)} queries, {errors} errors)")
+    print(f"   ⏱️ latency: {benchmark.format_stats(overall)}")
+    results["all"] = {"stats": overall, "count": len(samples), "qps": qps, "errors": errors,
+                      "rows": sum(rows for _, _, _, rows, _ in samples),
+                      "bytes": sum(size for _, _, _, _, size in samples)}
+    return results
+
+def run_concurrent(args):
+    selected = args.query or list(QUERIES)
+    mix = parse_mix(selected, args.mix)
+    unknown = [name for name in mix if name not in QUERIES]
+    if unknown:
+        print(f"❌ Unknown queries: {', '.join(unknown)} (available: {', '.join(QUERIES)})")
+        return 2
+
+    sqls = {name: with_table_suffix(QUERIES[name], args.table_suffix) for name in mix}
+
+    if not args.skip_ddl:
+        conn = connect(args.host, args.port)
+        create_tables(conn.cursor())
+        conn.close()
+
+    print(f"\n🚀 {args.clients} {args.mode} clients for {args.duration:g}s "
+          f"(+{args.warmup:g}s warm-up), mix: {mix}")
+    if args.mode == "threads":
+        pool = HiveConnectionPool(args.pool_size or args.clients, args.host, args.port, *make_cache(args))
+        executor = ThreadPoolExecutor(max_workers=args.clients)
+        submit = lambda i, *rest: executor.submit(run_client, pool, i, *rest)
+    else:
+        # Connections cannot cross process boundaries: each process keeps its own
+        pool = None
+        executor = ProcessPoolExecutor(max_workers=args.clients, initializer=init_client,
+                                       initargs=(args,))
+        submit = lambda i, *rest: executor.submit(run_process_client, i, *rest)
+
+    with executor:
+        started = time.time()
+        deadline = started + args.warmup + args.duration
+        futures = [submit(i, mix, sqls, started, deadline, args.warmup, args.fetch, args.arraysize)
+                   for i in range(args.clients)]
+        samples, errors = [], 0
+        for future in futures:
+            client_samples, client_errors = future.result()
+            samples.extend(client_samples)
+            errors += client_errors
+        finished = time.time()
+    if pool is not None:
+        if pool.cache is not None:
+            print(f"🗃️ Query cache: {pool.cache.stats}")
+            pool.watermarks.close()
+        pool.close()
+
+    window = max(finished - started - args.warmup, 1e-9)
+    results = {"meta": benchmark.run_metadata(hive_host=args.host, clients=args.clients, mode=args.mode,
+                                              duration=args.duration, warmup=args.warmup, mix=mix,
+                                              fetch=args.fetch, arraysize=args.arraysize, cache=args.cache,
+                                              table_suffix=args.table_suffix),
+               "queries": concurrent_report(samples, errors, window, args.clients)}
+    benchmark.write_results(args.output, results)
+    print(f"💾 Results written to {args.output}")
+    return 0
+
+def compare(args):
+    rows = benchmark.compare_results(benchmark.load_results(args.baseline), benchmark.load_results(args.current),
+                                     args.threshold, args.metric)
+    regressions = benchmark.print_comparison(rows, args.metric, args.threshold)
+    return 1 if regressions else 0
+
+def list_queries(args):
+    for name, sql in QUERIES.items():
+        print(f"{name}: {' '.join(sql.split())[:100]}")
+    return 0
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache", action="store_true",
+                        help="answer repeated SELECTs from a result cache invalidated by the ingest watermarks")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_SECONDS, help="max age of a cached result")
+    parser.add_argument("--cache-spill-dir", help="pickle results evicted from the in-memory LRU here")
+    parser.add_argument("--watermark-poll", type=float, default=WATERMARK_FLUSH_SECONDS,
+                        help="seconds between reads of the watermark table (bounds cache staleness)")
+    parser.add_argument("--hbase-host", default=HBASE_HOST, help="HBase Thrift host holding the watermarks")
+
+def add_table_suffix_argument(parser):
+    parser.add_argument("--table-suffix", default="",
+                        help=f"run the queries against <table><suffix>, e.g. {PARQUET_SUFFIX} for the export.py copy")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hive query benchmark over the HBase-backed tables")
+    sub = parser.add_subparsers(dest="command")
+
+    run_parser = sub.add_parser("run", help="run registered queries and record latency stats")
+    run_parser.add_argument("--query", action="append", help="query name to run (repeatable, default: all)")
+    run_parser.add_argument("--warmup", type=int, default=WARMUP_RUNS)
+    run_parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    run_parser.add_argument("--output", default="hive_benchmark.json", help=".json or .csv results file")
+    run_parser.add_argument("--host", default=HIVE_HOST)
+    run_parser.add_argument("--port", type=int, default=HIVE_PORT)
+    run_parser.add_argument("--fetch", choices=["stream", "columnar", "all"], default=FETCH_MODE,
+                            help="stream rows with fetchmany, fill typed column buffers, or fetchall()")
+    run_parser.add_argument("--arraysize", type=int, default=FETCH_ARRAYSIZE, help="rows per fetchmany call")
+    run_parser.add_argument("--skip-ddl", action="store_true", help="do not (re)create the external tables")
+    add_cache_arguments(run_parser)
+    add_table_suffix_argument(run_parser)
+    run_parser.set_defaults(func=run_benchmarks)
+
+    load_parser = sub.add_parser("concurrent", help="run a query mix from many clients and report queries/sec")
+    load_parser.add_argument("--query", action="append", help="query in the mix (repeatable, default: all)")
+    load_parser.add_argument("--mix", action="append", metavar="NAME=WEIGHT",
+                             help="relative weight of a query in the mix (repeatable)")
+    load_parser.add_argument("--clients", type=int, default=CONCURRENT_CLIENTS)
+    load_parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+    load_parser.add_argument("--pool-size", type=int, help="connections shared by the client threads "
+                                                          "(default: one per client)")
+    load_parser.add_argument("--duration", type=float, default=CONCURRENT_DURATION, help="measured seconds")
+    load_parser.add_argument("--warmup", type=float, default=CONCURRENT_WARMUP,
+                             help="seconds of load before samples are recorded")
+    load_parser.add_argument("--output", default="hive_concurrent.json", help=".json or .csv results file")
+    load_parser.add_argument("--host", default=HIVE_HOST)
+    load_parser.add_argument("--port", type=int, default=HIVE_PORT)
+    load_parser.add_argument("--fetch", choices=["stream", "columnar", "all"], default=FETCH_MODE)
+    load_parser.add_argument("--arraysize", type=int, default=FETCH_ARRAYSIZE)
+    load_parser.add_argument("--skip-ddl", action="store_true", help="do not (re)create the external tables")
+    add_cache_arguments(load_parser)
+    add_table_suffix_argument(load_parser)
+    load_parser.set_defaults(func=run_concurrent)
+
+    compare_parser = sub.add_parser("compare", help="flag regressions against a baseline results file")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=benchmark.DEFAULT_THRESHOLD,
+                                help="relative slowdown that counts as a regression (0.10 = 10%%)")
+    compare_parser.add_argument("--metric", default=benchmark.DEFAULT_METRIC,
+                                help="statistic to compare (p50, p95, p99, mean, ...)")
+    compare_parser.set_defaults(func=compare)
+
+    list_parser = sub.add_parser("list", help="show the registered queries")
+    list_parser.set_defaults(func=list_queries)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(["run"] + (argv if argv is not None else sys.argv[1:]))
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,13 +2,26 @@ import os
 import glob
 import pandas as pd
 import happybase
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+from dateutil import tz
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rowkey import get_codec
+from codec import encode_value, encode_values, encode_millis, encode_millis_many
+from rollup import RollupAccumulator, ROLLUP_TABLE, flush_rollups
+from watermark import ensure_watermark_table, advance_watermarks
+from provision import load_table_config, create_table
 
 HBASE_HOST = "localhost"
 COLUMN_FAMILY = "cf"
 TARGET_DIR = "./Measurements"
 LOAD_PERCENTAGE = 0.5
+BATCH_SIZE = 1000
+HOUR_FORMAT = '%Y-%m-%d %H'
+
+ROW_KEY_CODEC = get_codec()
 
 ENTITY_MAPPING = {
     "Room1": "room1_data",
@@ -25,12 +38,26 @@ SENSOR_TYPES = {
     "brightness": "brightness"
 }
 
-def random_timestamp_within_range():
-    base = datetime.now()
-    offset_days = random.randint(0, 5)
-    random_time = base + timedelta(days=offset_days, hours=random.randint(0, 23), minutes=random.randint(0, 59),
-                                   seconds=random.randint(0, 59), microseconds=random.randint(0, 999999))
-    return random_time.strftime('%Y-%m-%d %H:%M:%S.%f')
+def entity_id(entity):
+    return f"urn:ngsi-ld:{entity}:{entity}"
+
+def latest_measurement(csv_files):
+    return max(pd.read_csv(f, sep='\t', header=None, usecols=[0]).iloc[:, 0].max() for f in csv_files)
+
+def compute_time_shift(csv_files, mode):
+    # "now" moves the whole data set forward so that its newest reading lands at the current time,
+    # keeping the original order and spacing of every reading
+    if mode == "now":
+        return time.time() - latest_measurement(csv_files)
+    return 0.0
+
+def to_millis(epoch_seconds, time_shift=0.0):
+    return np.round((np.asarray(epoch_seconds, dtype=np.float64) + time_shift) * 1000).astype(np.int64)
+
+def format_hours(ts_millis):
+    # Local hour of each reading, the key of the hourly rollups
+    local = pd.to_datetime(ts_millis, unit="ms", utc=True).tz_convert(tz.tzlocal())
+    return pd.Series(local.strftime(HOUR_FORMAT))
 
 def infer_entity_and_sensor(filename):
     entity = None
@@ -46,7 +73,9 @@ def infer_entity_and_sensor(filename):
             break
     return entity, sensor
 
-def reset_table(connection, table_name):
+def reset_table(connection, table_name, config=None):
+    # With --table-config the table is pre-split through the HBase shell, so the bulk load spreads over every region
+    # from the first row; without it the table is created through Thrift as a single region
     encoded_name = table_name.encode()
     if encoded_name in connection.tables():
         try:
@@ -56,18 +85,36 @@ def reset_table(connection, table_name):
         except Exception as e:
             print(f"❌ Failed to delete table {table_name}: {e}")
     try:
-        connection.create_table(encoded_name, {COLUMN_FAMILY: dict()})
-        print(f"✅ Created table: {table_name}")
+        if config is not None:
+            regions = create_table(connection, table_name, config, ROW_KEY_CODEC)
+        else:
+            connection.create_table(encoded_name, {COLUMN_FAMILY: dict()})
+            regions = 1
+        print(f"✅ Created table: {table_name} ({regions} regions)")
     except Exception as e:
         print(f"❌ Failed to create table {table_name}: {e}")
 
-def insert_csv_to_hbase(file_path, connection):
+def write_rollups(connection, rollups, table_name):
+    try:
+        # Each (room, hour, sensor) cell is owned by a single file or room of this freshly reset load
+        cells = flush_rollups(connection, rollups.drain(), exclusive=True)
+        print(f"📈 Aggiornati {cells} aggregati orari per {table_name}")
+    except Exception as e:
+        print(f"❌ Failed to update hourly rollups for {table_name}: {e}")
+    try:
+        # Invalidates cached Hive results over the tables this load has just written
+        advance_watermarks(connection, [table_name, ROLLUP_TABLE])
+    except Exception as e:
+        print(f"❌ Failed to advance the ingest watermark for {table_name}: {e}")
+
+def insert_csv_to_hbase(file_path, connection, time_shift=0.0):
     filename = os.path.basename(file_path)
     entity, sensor = infer_entity_and_sensor(filename)
     if not entity or not sensor:
         print(f"❌ Impossibile inferire entità o tipo sensore da {filename}")
-        return
+        return 0, 0.0
 
+    started = time.perf_counter()
     table_name = ENTITY_MAPPING[entity]
     table = connection.table(table_name.encode())
 
@@ -80,34 +127,248 @@ def insert_csv_to_hbase(file_path, connection):
         df = df.sample(frac=LOAD_PERCENTAGE, random_state=42)
         print(f"🔍 After sampling: {len(df)} rows")
 
+    eid = entity_id(entity)
+    rollups = RollupAccumulator()
     for i, row in df.iterrows():
-        ts = random_timestamp_within_range()
-        rowkey = f"{entity}_{ts}_{i}".encode()
+        ts_millis = int(to_millis(row["timestamp"], time_shift))
+        hour = datetime.fromtimestamp(ts_millis / 1000).strftime(HOUR_FORMAT)
+        rowkey = ROW_KEY_CODEC.encode(eid, ts_millis)
 
         data = {
-            b'cf:timestamp': ts.encode(),
-            f"cf:{sensor}".encode(): str(row["value"]).encode()
+            b'cf:entity': eid.encode(),
+            b'cf:timestamp': encode_millis(ts_millis),
+            f"cf:{sensor}".encode(): encode_value(sensor, row["value"])
         }
 
         try:
             table.put(rowkey, data)
+            rollups.add(table_name[:-len("_data")], hour, sensor, row["value"])
         except Exception as e:
             print(f"❌ Failed to insert row {rowkey}: {e}")
 
-    print(f"✅ Inseriti {len(df)} record da {filename} nella tabella {table_name}")
+    write_rollups(connection, rollups, table_name)
+
+    elapsed = time.perf_counter() - started
+    rate = len(df) / elapsed if elapsed > 0 else float("inf")
+    print(f"✅ Inseriti {len(df)} record da {filename} nella tabella {table_name} "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return len(df), elapsed
+
+def load_measurements(file_path):
+    df = pd.read_csv(file_path, sep='\t', header=None, names=["timestamp", "value"])
+    original_rows = len(df)
+    df = df.dropna(how='any')
+    if LOAD_PERCENTAGE < 1.0:
+        df = df.sample(frac=LOAD_PERCENTAGE, random_state=42)
+    return df, original_rows
+
+def bulk_insert_csv_to_hbase(file_path, connection, batch_size=BATCH_SIZE, time_shift=0.0):
+    filename = os.path.basename(file_path)
+    entity, sensor = infer_entity_and_sensor(filename)
+    if not entity or not sensor:
+        print(f"❌ Impossibile inferire entità o tipo sensore da {filename}")
+        return 0, 0.0
+
+    started = time.perf_counter()
+    table_name = ENTITY_MAPPING[entity]
+    table = connection.table(table_name.encode())
+
+    df, original_rows = load_measurements(file_path)
+    print(f"📄 File: {filename} | Original rows: {original_rows} | Loading: {len(df)}")
+
+    # Build every row key and cell column-wise, then stream them through one batch
+    eid = entity_id(entity)
+    ts_millis = to_millis(df["timestamp"], time_shift)
+    rowkeys = ROW_KEY_CODEC.encode_many(eid, ts_millis)
+    ts_cells = encode_millis_many(ts_millis)
+    value_cells = encode_values(sensor, df["value"])
+    column = f"{COLUMN_FAMILY}:{sensor}".encode()
+    entity_cell = eid.encode()
+
+    try:
+        with table.batch(batch_size=batch_size) as batch:
+            for rowkey, ts, value in zip(rowkeys, ts_cells, value_cells):
+                batch.put(rowkey, {b'cf:entity': entity_cell, b'cf:timestamp': ts, column: value})
+    except Exception as e:
+        print(f"❌ Bulk insert into {table_name} failed: {e}")
+        return 0, time.perf_counter() - started
+
+    rollups = RollupAccumulator()
+    rollups.add_frame(table_name[:-len("_data")], format_hours(ts_millis), sensor, df["value"])
+    write_rollups(connection, rollups, table_name)
+
+    elapsed = time.perf_counter() - started
+    rate = len(df) / elapsed if elapsed > 0 else float("inf")
+    print(f"✅ Inseriti {len(df)} record da {filename} nella tabella {table_name} "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return len(df), elapsed
+
+def merge_room_measurements(file_paths, tolerance=0):
+    # Long format (timestamp, sensor, value) for every reading of the room, sorted by the original epoch
+    frames, dtypes = [], {}
+    for file_path in file_paths:
+        _, sensor = infer_entity_and_sensor(os.path.basename(file_path))
+        df = pd.read_csv(file_path, sep='\t', header=None, names=["timestamp", "value"]).dropna(how='any')
+        dtypes[sensor] = df["value"].dtype
+        frames.append(df.assign(sensor=sensor))
+    readings = pd.concat(frames, ignore_index=True).sort_values("timestamp", kind="stable")
+
+    # A reading joins the current instant while that instant has no value for its sensor yet and started at most
+    # tolerance seconds earlier; otherwise it opens a new instant, so every reading lands in exactly one row
+    instant = np.empty(len(readings), dtype=np.int64)
+    current, start, seen = -1, None, set()
+    for i, (ts, sensor) in enumerate(zip(readings["timestamp"].to_numpy(), readings["sensor"].to_numpy())):
+        if start is None or sensor in seen or ts - start > tolerance:
+            current, start, seen = current + 1, ts, set()
+        seen.add(sensor)
+        instant[i] = current
+    wide = readings.assign(instant=instant).pivot(index="instant", columns="sensor", values="value")
+    wide.insert(0, "timestamp", readings.groupby(instant)["timestamp"].first())
+    for sensor, dtype in dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype):
+            wide[sensor] = wide[sensor].round().astype("Int64")
+    return wide.reset_index(drop=True)
+
+def wide_insert_room_to_hbase(entity, file_paths, connection, batch_size=BATCH_SIZE, tolerance=0, time_shift=0.0):
+    started = time.perf_counter()
+    table_name = ENTITY_MAPPING[entity]
+    table = connection.table(table_name.encode())
+
+    wide = merge_room_measurements(file_paths, tolerance)
+    merged_rows = len(wide)
+    readings = int(wide.drop(columns="timestamp").notna().to_numpy().sum())
+    if LOAD_PERCENTAGE < 1.0:
+        wide = wide.sample(frac=LOAD_PERCENTAGE, random_state=42).sort_index()
+    print(f"📄 Room: {entity} | {len(file_paths)} file, {readings} readings -> {merged_rows} wide rows | "
+          f"Loading: {len(wide)}")
+
+    eid = entity_id(entity)
+    ts_millis = to_millis(wide["timestamp"], time_shift)
+    rowkeys = ROW_KEY_CODEC.encode_many(eid, ts_millis)
+    ts_cells = encode_millis_many(ts_millis)
+    entity_cell = eid.encode()
+    sensor_cells = []
+    for sensor in SENSOR_TYPES.values():
+        if sensor in wide:
+            missing = wide[sensor].isna().to_numpy()
+            cells = np.empty(len(wide), dtype=object)
+            cells[:] = encode_values(sensor, wide[sensor].astype(float).fillna(0).to_numpy())
+            cells[missing] = None
+            sensor_cells.append((f"{COLUMN_FAMILY}:{sensor}".encode(), cells))
+
+    try:
+        with table.batch(batch_size=batch_size) as batch:
+            for i, rowkey in enumerate(rowkeys):
+                data = {b'cf:entity': entity_cell, b'cf:timestamp': ts_cells[i]}
+                for column, cells in sensor_cells:
+                    if cells[i] is not None:
+                        data[column] = cells[i]
+                batch.put(rowkey, data)
+    except Exception as e:
+        print(f"❌ Wide insert into {table_name} failed: {e}")
+        return 0, time.perf_counter() - started
+
+    rollups = RollupAccumulator()
+    hours = format_hours(ts_millis)
+    for sensor in SENSOR_TYPES.values():
+        if sensor in wide:
+            present = wide[sensor].notna().to_numpy()
+            rollups.add_frame(table_name[:-len("_data")], hours[present], sensor, wide[sensor][present])
+    write_rollups(connection, rollups, table_name)
+
+    elapsed = time.perf_counter() - started
+    rate = len(wide) / elapsed if elapsed > 0 else float("inf")
+    print(f"✅ Inseriti {len(wide)} record larghi per {entity} nella tabella {table_name} "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return len(wide), elapsed
+
+def group_files_by_entity(csv_files):
+    rooms = {}
+    for file_path in csv_files:
+        entity, sensor = infer_entity_and_sensor(os.path.basename(file_path))
+        if entity and sensor:
+            rooms.setdefault(entity, []).append(file_path)
+    return rooms
+
+worker_connection = None
+
+def init_worker():
+    global worker_connection
+    worker_connection = happybase.Connection(HBASE_HOST)
+
+def load_room(entity, file_paths, batch_size, tolerance, time_shift):
+    return wide_insert_room_to_hbase(entity, file_paths, worker_connection, batch_size, tolerance, time_shift)
+
+def load_file(file_path, bulk, batch_size, time_shift):
+    if bulk:
+        return bulk_insert_csv_to_hbase(file_path, worker_connection, batch_size, time_shift)
+    return insert_csv_to_hbase(file_path, worker_connection, time_shift)
 
 def main():
+    parser = argparse.ArgumentParser(description="Load the Measurements CSVs into HBase")
+    parser.add_argument("--bulk", action="store_true", help="vectorized row building with batched puts")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="puts per HBase batch in bulk mode")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes, each with its own HBase connection")
+    parser.add_argument("--wide", action="store_true",
+                        help="merge each room's sensor files into one row per instant")
+    parser.add_argument("--tolerance", type=float, default=0,
+                        help="max seconds between the first and last reading merged into the same wide row")
+    parser.add_argument("--time-shift", choices=["now", "none"], default="now",
+                        help="'now' shifts the original timestamps so the newest reading lands at the current time")
+    parser.add_argument("--table-config", help="JSON file with the regions and column family options of the tables; "
+                                                 "without it they are created as a single region")
+    args = parser.parse_args()
+
     connection = happybase.Connection(HBASE_HOST)
 
     # reset all target tables once before insertion
+    table_config = load_table_config(args.table_config)
     for table in ENTITY_MAPPING.values():
-        reset_table(connection, table)
+        reset_table(connection, table, table_config)
+    reset_table(connection, ROLLUP_TABLE)
+    ensure_watermark_table(connection)
+    advance_watermarks(connection, list(ENTITY_MAPPING.values()) + [ROLLUP_TABLE])
 
     csv_files = glob.glob(os.path.join(TARGET_DIR, "*.csv"))
-    for file_path in csv_files:
-        insert_csv_to_hbase(file_path, connection)
+    time_shift = compute_time_shift(csv_files, args.time_shift)
+    started = time.perf_counter()
+    total_rows = 0
+    rooms = group_files_by_entity(csv_files)
+    if args.workers > 1:
+        connection.close()
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            if args.wide:
+                futures = {executor.submit(load_room, e, files, args.batch_size, args.tolerance, time_shift): e
+                           for e, files in rooms.items()}
+            else:
+                futures = {executor.submit(load_file, f, args.bulk, args.batch_size, time_shift): os.path.basename(f)
+                           for f in csv_files}
+            for future in as_completed(futures):
+                try:
+                    rows, _ = future.result()
+                    total_rows += rows
+                except Exception as e:
+                    print(f"❌ Failed to load {futures[future]}: {e}")
+    elif args.wide:
+        for entity, file_paths in rooms.items():
+            rows, _ = wide_insert_room_to_hbase(entity, file_paths, connection, args.batch_size, args.tolerance,
+                                                time_shift)
+            total_rows += rows
+        connection.close()
+    else:
+        for file_path in csv_files:
+            if args.bulk:
+                rows, _ = bulk_insert_csv_to_hbase(file_path, connection, args.batch_size, time_shift)
+            else:
+                rows, _ = insert_csv_to_hbase(file_path, connection, time_shift)
+            total_rows += rows
+        connection.close()
 
-    connection.close()
+    wall = time.perf_counter() - started
+    if wall > 0:
+        print(f"📊 Totale: {total_rows} record da {len(csv_files)} file in {wall:.2f}s "
+              f"({total_rows / wall:,.0f} rows/sec, {args.workers} worker)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+import os
+import glob
+import time
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+
+import aiohttp
+
+import benchmark
+import real_time_data_simulator
+from real_time_data_simulator import (ORION_LD_URL, ENTITY_OPS_URL, HEADERS, NGSI_LD_CONTEXT, reading_attribute,
+                                      read_measurements, create_entity_if_absent, add_reading, readings_in,
+                                      multi_status_failures)
+
+TARGET_RATE = 100.0
+CONCURRENCY = 32
+DURATION = 30.0
+BATCH_SIZE = 1
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return now
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def reading_source(folder):
+    streams = []
+    for file_path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        room, context = os.path.basename(file_path).replace(".csv", "").split("_", 1)
+        values = [float(line.split("\t")[1]) for line in read_measurements(file_path, 1.0) if "\t" in line]
+        if values:
+            streams.append((room, context.lower(), itertools.cycle(values)))
+    # Files are read up front so the first requests are not delayed by CSV parsing
+    return round_robin(streams)
+
+def round_robin(streams):
+    # Endless round-robin over every room/attribute so the mix stays constant for any duration
+    for room, context, values in itertools.cycle(streams):
+        yield room, context, next(values)
+
+def patch_request(room, context, value):
+    entity_id = f"urn:ngsi-ld:{room}:{room}"
+    payload = {context: reading_attribute(value, datetime.now(timezone.utc)), "@context": NGSI_LD_CONTEXT}
+    return "PATCH", f"{ORION_LD_URL}{entity_id}/attrs", None, payload
+
+def upsert_request(readings):
+    fragments, open_fragments = [], {}
+    for room, context, value in readings:
+        add_reading(fragments, open_fragments, room, context, value, datetime.now(timezone.utc))
+    return "POST", f"{ENTITY_OPS_URL}upsert", {"options": "update"}, fragments
+
+async def partial_updates(response, fragments):
+    # Only the readings of the entities without an error count as sent
+    try:
+        failures = multi_status_failures(fragments, await response.json(content_type=None))
+    except ValueError:
+        return 0
+    return sum(readings_in(f) for f in fragments) - sum(readings_in(f) for f, _ in failures)
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.scheduled_latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.updates = 0
+
+async def send(session, request, updates, scheduled_at, result):
+    method, url, params, payload = request
+    started = time.monotonic()
+    try:
+        async with session.request(method, url, params=params, json=payload) as r:
+            await r.read()
+            result.statuses[r.status] += 1
+            if r.status == 207:
+                result.updates += await partial_updates(r, payload)
+            elif r.status < 300:
+                result.updates += updates
+    except Exception as e:
+        result.errors[type(e).__name__] += 1
+    finished = time.monotonic()
+    result.latencies.append(finished - started)
+    # Measured from when the token was granted, so queueing behind the concurrency cap is not hidden
+    result.scheduled_latencies.append(finished - scheduled_at)
+
+async def run_load(rate=TARGET_RATE, concurrency=CONCURRENCY, duration=DURATION, batch_size=BATCH_SIZE,
+                   folder="./Measurements"):
+    readings = reading_source(folder)
+    # The bucket paces requests; each request carries batch_size updates
+    bucket = TokenBucket(rate / batch_size)
+    slots = asyncio.Semaphore(concurrency)
+    result = LoadResult()
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=10)
+
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=timeout) as session:
+        tasks = set()
+
+        async def guarded(request, updates, scheduled_at):
+            try:
+                await send(session, request, updates, scheduled_at, result)
+            finally:
+                slots.release()
+
+        started = time.monotonic()
+        deadline = started + duration
+        while time.monotonic() < deadline:
+            scheduled_at = await bucket.acquire()
+            await slots.acquire()
+            if batch_size > 1:
+                request = upsert_request([next(readings) for _ in range(batch_size)])
+            else:
+                request = patch_request(*next(readings))
+            task = asyncio.create_task(guarded(request, batch_size, scheduled_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    return result, elapsed
+
+def report(result, elapsed, rate, concurrency, batch_size):
+    latency = benchmark.summarize([x * 1000 for x in result.latencies])
+    scheduled = benchmark.summarize([x * 1000 for x in result.scheduled_latencies])
+    achieved = result.updates / elapsed if elapsed > 0 else 0.0
+    print(f"📊 Target {rate:,.0f} updates/sec, achieved {achieved:,.0f} updates/sec "
+          f"({len(result.latencies)} requests x {batch_size} in {elapsed:.1f}s, concurrency {concurrency})")
+    print(f"   status codes: {dict(result.statuses)}" + (f" | errors: {dict(result.errors)}" if result.errors else ""))
+    print(f"   ⏱️ latency:            {benchmark.format_stats(latency, 'ms')}")
+    print(f"   ⏱️ latency (from slot): {benchmark.format_stats(scheduled, 'ms')}")
+    return {"meta": benchmark.run_metadata(target_rate=rate, concurrency=concurrency, batch_size=batch_size,
+                                           elapsed=elapsed, achieved_rate=achieved,
+                                           statuses={str(k): v for k, v in result.statuses.items()},
+                                           errors=dict(result.errors)),
+            "queries": {"request": {"stats": latency, "scheduled_stats": scheduled,
+                                    "rows": result.updates, "bytes": 0}}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate-controlled asyncio load generator for Orion-LD")
+    parser.add_argument("--rate", type=float, default=TARGET_RATE, help="target aggregate updates/sec")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="max in-flight requests")
+    parser.add_argument("--duration", type=float, default=DURATION, help="seconds to generate load")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="updates per request: 1 sends PATCH /attrs, more uses entityOperations/upsert")
+    parser.add_argument("--folder", default="./Measurements")
+    parser.add_argument("--setup", action="store_true", help="pre-create the entities before the run")
+    parser.add_argument("--output", help="write the results as .json or .csv")
+    parser.add_argument("--trace", action="store_true",
+                        help="stamp sentAt/traceId into every reading for end-to-end latency tracing")
+    args = parser.parse_args()
+    real_time_data_simulator.TRACE_READINGS = args.trace
+
+    if args.setup:
+        for file_path in glob.glob(os.path.join(args.folder, "*.csv")):
+            room, context = os.path.basename(file_path).replace(".csv", "").split("_", 1)
+            create_entity_if_absent(room, context)
+
+    result, elapsed = asyncio.run(run_load(args.rate, args.concurrency, args.duration, args.batch_size,
+                                           args.folder))
+    results = report(result, elapsed, args.rate, args.concurrency, args.batch_size)
+    if args.output:
+        benchmark.write_results(args.output, results)
+        print(f"💾 Results written to {args.output}")
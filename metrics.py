@@ -0,0 +1,132 @@
+import time
+import logging
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOG_RATE_LIMIT_SECONDS = 5.0
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in items]
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, callback, labelnames=()):
+        # callback returns a number, or a {labelvalues: number} dict when labelnames are given
+        self.name, self.help, self.callback, self.labelnames = name, help, callback, tuple(labelnames)
+
+    def samples(self):
+        value = self.callback()
+        if not self.labelnames:
+            return [(self.name, "", value)]
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in sorted(value.items())]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, value, *labelvalues):
+        with self.lock:
+            # [cumulative bucket counts..., sum, count]
+            state = self.values.get(labelvalues)
+            if state is None:
+                state = self.values[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        n = len(self.buckets)
+        with self.lock:
+            items = sorted((k, (v[:n], v[n], v[n + 1])) for k, v in self.values.items())
+        out = []
+        for labelvalues, (counts, total, observed) in items:
+            for upper, count in zip(self.buckets, counts):
+                out.append((f"{self.name}_bucket", _labels(self.labelnames + ("le",), labelvalues + (upper,)), count))
+            out.append((f"{self.name}_bucket", _labels(self.labelnames + ("le",), labelvalues + ("+Inf",)), observed))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, labelvalues), total))
+            out.append((f"{self.name}_count", _labels(self.labelnames, labelvalues), observed))
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, callback, labelnames=()):
+        return self.register(Gauge(name, help, callback, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+class RateLimitFilter(logging.Filter):
+    # Lets one record per message template through every `interval` seconds and reports how many were dropped
+    def __init__(self, interval=LOG_RATE_LIMIT_SECONDS):
+        super().__init__()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            last, suppressed = self.last.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self.last[key] = (last, suppressed + 1)
+                return False
+            self.last[key] = (now, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+def setup_logging(level="INFO", interval=LOG_RATE_LIMIT_SECONDS):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(RateLimitFilter(interval))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
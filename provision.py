@@ -0,0 +1,165 @@
+import copy
+import json
+import time
+import shlex
+import bisect
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+
+import happybase
+
+from rowkey import get_codec, CODECS, ROWKEY_CODEC
+
+HBASE_HOST = "localhost"
+COLUMN_FAMILY = "cf"
+# Thrift's createTable cannot pre-split, so split tables are created through the HBase shell, e.g.
+# "docker compose -f aio-compose.yaml exec -T hbase-hive hbase shell -n" when HBase only runs in the container
+HBASE_SHELL = "hbase shell -n"
+SHELL_TIMEOUT = 300
+REGION_REFRESH_SECONDS = 60
+
+# Defaults under a JSON file with the same layout (--table-config). "regions": 0 means one region per salt bucket;
+# family options use happybase's names (max_versions, compression, in_memory, bloom_filter_type,
+# block_cache_enabled, time_to_live) and are merged over these defaults.
+FAMILY_OPTIONS = {"max_versions": 1, "compression": "NONE", "bloom_filter_type": "ROW", "block_cache_enabled": True}
+DEFAULT_TABLE_CONFIG = {
+    "regions": 0,
+    "hbase_shell": HBASE_SHELL,
+    "families": {COLUMN_FAMILY: FAMILY_OPTIONS},
+}
+
+# happybase option -> HBase shell attribute
+SHELL_ATTRIBUTES = {
+    "max_versions": "VERSIONS",
+    "compression": "COMPRESSION",
+    "in_memory": "IN_MEMORY",
+    "bloom_filter_type": "BLOOMFILTER",
+    "block_cache_enabled": "BLOCKCACHE",
+    "time_to_live": "TTL",
+}
+
+def load_table_config(path=None):
+    # None without a file: tables are then created through Thrift as a single region and the shell is never run
+    if not path:
+        return None
+    config = copy.deepcopy(DEFAULT_TABLE_CONFIG)
+    with open(path) as f:
+        overrides = json.load(f)
+    families = overrides.pop("families", None)
+    config.update(overrides)
+    if families is not None:
+        config["families"] = {name: dict(FAMILY_OPTIONS, **options) for name, options in families.items()}
+    return config
+
+def shell_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    return f"'{value}'"
+
+def shell_bytes(key):
+    # Double-quoted JRuby string, so every byte of a binary split key survives
+    return '"' + "".join(f"\\x{b:02x}" for b in key) + '"'
+
+def create_statement(table_name, families, splits):
+    descriptors = []
+    for name, options in families.items():
+        attributes = [f"NAME => '{name}'"] + [f"{SHELL_ATTRIBUTES[k]} => {shell_value(v)}"
+                                              for k, v in options.items() if k in SHELL_ATTRIBUTES and v is not None]
+        descriptors.append("{" + ", ".join(attributes) + "}")
+    statement = f"create '{table_name}', " + ", ".join(descriptors)
+    if splits:
+        statement += ", SPLITS => [" + ", ".join(shell_bytes(key) for key in splits) + "]"
+    return statement
+
+def run_shell(command, statement, timeout=SHELL_TIMEOUT):
+    # -n makes the shell exit non-zero on the first failed command
+    result = subprocess.run(shlex.split(command), input=statement + "\nexit\n", capture_output=True, text=True,
+                            timeout=timeout)
+    if result.returncode != 0:
+        lines = (result.stderr or result.stdout).strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit status {result.returncode}")
+
+def create_table(connection, table_name, config=None, codec=None):
+    # Pre-split on the row key's salt buckets through the HBase shell; without a usable shell the table is still
+    # created with the configured family options, as a single region. Returns the number of regions created.
+    config = config or DEFAULT_TABLE_CONFIG
+    families = config["families"]
+    splits = (codec or get_codec()).split_keys(config["regions"] or None)
+    if splits and config.get("hbase_shell"):
+        try:
+            run_shell(config["hbase_shell"], create_statement(table_name, families, splits))
+            return len(splits) + 1
+        except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+            print(f"⚠️ Could not pre-split {table_name} through '{config['hbase_shell']}' ({e}), "
+                  f"creating a single region")
+    connection.create_table(table_name, {name: {k: v for k, v in options.items() if v is not None}
+                                         for name, options in families.items()})
+    return 1
+
+class RegionMap:
+    # Start keys of each table's regions. The Thrift gateway already groups one mutateRows by region server, so
+    # a table's rows normally go out as a single batch; only after a failed write (until the next refresh) are
+    # they split into one batch per region, so a region that is moving or splitting only holds back its own rows
+    def __init__(self, refresh_seconds=REGION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.failed = {}
+
+    def start_keys(self, connection, table_name):
+        with self.lock:
+            cached = self.tables.get(table_name)
+        if cached is not None and time.monotonic() - cached[0] < self.refresh_seconds:
+            return cached[1]
+        regions = connection.table(table_name.encode()).regions()
+        start_keys = sorted(region["start_key"] for region in regions if region["start_key"])
+        with self.lock:
+            self.tables[table_name] = (time.monotonic(), start_keys)
+        return start_keys
+
+    def mark_failed(self, table_name):
+        # The region layout may have changed: re-read it, and split this table's batches for a while
+        with self.lock:
+            self.tables.pop(table_name, None)
+            self.failed[table_name] = time.monotonic()
+
+    def split(self, connection, table_name, rows, key=lambda row: row[0]):
+        with self.lock:
+            failed = self.failed.get(table_name)
+            if failed is not None and time.monotonic() - failed >= self.refresh_seconds:
+                del self.failed[table_name]
+                failed = None
+        if failed is None:
+            return [rows]
+        start_keys = self.start_keys(connection, table_name)
+        if not start_keys:
+            return [rows]
+        groups = defaultdict(list)
+        for row in rows:
+            groups[bisect.bisect_right(start_keys, key(row))].append(row)
+        return [groups[region] for region in sorted(groups)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print or run the HBase shell statements that pre-split the tables")
+    parser.add_argument("tables", nargs="+")
+    parser.add_argument("--table-config", help="JSON file with regions, hbase_shell and column family options")
+    parser.add_argument("--codec", default=ROWKEY_CODEC, choices=sorted(CODECS), help="row key layout of the tables")
+    parser.add_argument("--host", default=HBASE_HOST)
+    parser.add_argument("--create", action="store_true", help="create the tables instead of printing the statements")
+    args = parser.parse_args()
+
+    config = load_table_config(args.table_config) or copy.deepcopy(DEFAULT_TABLE_CONFIG)
+    codec = get_codec(args.codec)
+    if not args.create:
+        for table_name in args.tables:
+            print(create_statement(table_name, config["families"], codec.split_keys(config["regions"] or None)))
+    else:
+        connection = happybase.Connection(args.host)
+        for table_name in args.tables:
+            regions = create_table(connection, table_name, config, codec)
+            print(f"✅ Created table: {table_name} ({regions} regions)")
+        connection.close()
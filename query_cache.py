@@ -0,0 +1,213 @@
+import os
+import re
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_ENTRIES = 256
+CACHE_TTL_SECONDS = 300.0
+CACHE_MAX_ROWS = 100000
+SPILL_ENTRIES = 1024
+
+QUOTED = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+TABLE_REF = re.compile(r"\b(?:from|join)\s+([a-z_][\w.]*)")
+CACHEABLE = re.compile(r"^(select|with)\b")
+
+def normalize_sql(sql):
+    # Whitespace and keyword case do not change a query; string literals are kept verbatim
+    parts = QUOTED.split(sql.strip().rstrip(";"))
+    return "".join(part if i % 2 else " ".join(part.split()).lower() for i, part in enumerate(parts)).strip()
+
+def referenced_tables(normalized):
+    unquoted = "".join(part for i, part in enumerate(QUOTED.split(normalized)) if i % 2 == 0)
+    return sorted({name.split(".")[-1] for name in TABLE_REF.findall(unquoted)})
+
+class CachedResult:
+    def __init__(self, description, rows, watermarks):
+        self.description = description
+        self.rows = rows
+        self.watermarks = watermarks
+        self.created = time.time()
+
+class QueryCache:
+    # In-memory LRU of result sets; entries evicted from memory are pickled to spill_dir (if set) and reloaded on a hit
+    def __init__(self, max_entries=CACHE_ENTRIES, ttl=CACHE_TTL_SECONDS, spill_dir=None, spill_entries=SPILL_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.spill_entries = spill_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.spilled = OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "invalidated": 0, "spilled": 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def spill_path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha1(key.encode()).hexdigest() + ".pkl")
+
+    def fresh(self, entry, watermarks):
+        if self.ttl and time.time() - entry.created > self.ttl:
+            return False
+        return all(watermarks.get(table) == version for table, version in entry.watermarks.items())
+
+    def get(self, key, watermarks):
+        with self.lock:
+            entry = self.entries.get(key)
+            from_disk = False
+            if entry is None and key in self.spilled:
+                entry = self.load_spilled(key)
+                from_disk = entry is not None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if not self.fresh(entry, watermarks):
+                self.entries.pop(key, None)
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+            if from_disk:
+                self.stats["disk_hits"] += 1
+                self.insert(key, entry)
+            else:
+                self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.insert(key, entry)
+
+    def insert(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            old_key, old_entry = self.entries.popitem(last=False)
+            if self.spill_dir:
+                self.spill(old_key, old_entry)
+
+    def spill(self, key, entry):
+        with open(self.spill_path(key), "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled[key] = True
+        self.spilled.move_to_end(key)
+        self.stats["spilled"] += 1
+        while len(self.spilled) > self.spill_entries:
+            old_key, _ = self.spilled.popitem(last=False)
+            self.remove_spilled(old_key)
+
+    def load_spilled(self, key):
+        del self.spilled[key]
+        try:
+            with open(self.spill_path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self.remove_spilled(key)
+        return entry
+
+    def remove_spilled(self, key):
+        try:
+            os.remove(self.spill_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for key in list(self.spilled):
+                self.remove_spilled(key)
+            self.spilled.clear()
+
+class QueryService:
+    # Wraps a PyHive connection: SELECTs are answered from the cache while the watermarks of the tables they read
+    # have not moved; anything else goes straight to Hive
+    def __init__(self, connection, cache, watermarks, max_rows=CACHE_MAX_ROWS):
+        self.connection = connection
+        self.cache = cache
+        self.watermarks = watermarks
+        self.max_rows = max_rows
+
+    def current_watermarks(self):
+        try:
+            return self.watermarks()
+        except Exception as e:
+            print(f"⚠️ Watermarks unavailable, bypassing the query cache: {e}")
+            return None
+
+    def cursor(self):
+        return CachingCursor(self)
+
+    def close(self):
+        self.connection.close()
+
+class CachingCursor:
+    # DB-API subset used by hive.run_query: execute, description, fetchmany, fetchall, close
+    def __init__(self, service):
+        self.service = service
+        self.cursor = None
+        self.arraysize = 1
+        self.description = None
+        self.reset()
+
+    def reset(self):
+        self.rows, self.position = None, 0
+        self.key, self.snapshot, self.pending = None, None, None
+
+    def execute(self, sql):
+        self.reset()
+        key = normalize_sql(sql)
+        watermarks = self.service.current_watermarks() if CACHEABLE.match(key) else None
+        if watermarks is not None:
+            entry = self.service.cache.get(key, watermarks)
+            if entry is not None:
+                self.description, self.rows = entry.description, entry.rows
+                return
+            # Versions are captured before the query runs, so data landing meanwhile invalidates the entry
+            self.key = key
+            self.snapshot = {table: watermarks.get(table) for table in referenced_tables(key)}
+            self.pending = []
+
+        if self.cursor is None:
+            self.cursor = self.service.connection.cursor()
+        self.cursor.execute(sql)
+        self.description = self.cursor.description
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        if self.rows is not None:
+            batch = self.rows[self.position:self.position + size]
+            self.position += len(batch)
+            return batch
+        batch = self.cursor.fetchmany(size)
+        self.collect(batch)
+        return batch
+
+    def fetchall(self):
+        if self.rows is not None:
+            batch = self.rows[self.position:]
+            self.position = len(self.rows)
+            return batch
+        batch = self.cursor.fetchall()
+        self.collect(batch)
+        self.collect([])
+        return batch
+
+    def collect(self, batch):
+        if self.pending is None:
+            return
+        if not batch:
+            self.service.cache.put(self.key, CachedResult(self.description, self.pending, self.snapshot))
+            self.pending = None
+        elif len(self.pending) + len(batch) > self.service.max_rows:
+            # Too large to be worth keeping: stream the rest without caching
+            self.pending = None
+        else:
+            self.pending.extend(batch)
+
+    def close(self):
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
@@ -2,13 +2,24 @@ import os
 import glob
 import time
 import requests
+import heapq
+import argparse
+import threading
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor
+from tracing import stamp_attribute
 
 ORION_LD_URL = "http://127.0.0.1:1026/ngsi-ld/v1/entities/"
+ENTITY_OPS_URL = "http://127.0.0.1:1026/ngsi-ld/v1/entityOperations/"
+NGSI_LD_CONTEXT = "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"
 HEADERS = {"Content-Type": "application/ld+json"}
 DELAY = 0.25
 MAX_PERCENT_PER_THREAD = 0.25 
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 0.5
+BATCH_ENDPOINT = "upsert"
+REPLAY_SPEEDUP = 100.0
+TRACE_READINGS = False
 last_room = None
 update_counts = {}
 
@@ -40,11 +51,7 @@ def send_patch(room, context, timestamp, value):
     context_attr = context.lower()
 
     attr_payload = {
-    context_attr: {
-        "type": "Property",
-        "value": float(value),
-        "observedAt": timestamp.isoformat()
-    },
+    context_attr: reading_attribute(value, timestamp),
         "@context": "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"}
 
     try:
@@ -112,6 +119,247 @@ def send_patch(room, context, timestamp, value):
         else:
             print(f"[{room}/{context}] Error in PATCH @ {timestamp}: {e}")
 
+def reading_attribute(value, timestamp):
+    attribute = {
+        "type": "Property",
+        "value": float(value),
+        "observedAt": timestamp.isoformat()
+    }
+    if TRACE_READINGS:
+        stamp_attribute(attribute)
+    return attribute
+
+def add_reading(fragments, open_fragments, room, context_attr, value, timestamp):
+    # open_fragments maps each entity id to its last fragment in fragments
+    entity_id = f"urn:ngsi-ld:{room}:{room}"
+    fragment = open_fragments.get(entity_id)
+    if fragment is None or context_attr in fragment:
+        # A second reading of the same attribute goes into a new fragment so it is not overwritten
+        fragment = {"id": entity_id, "type": room, "@context": NGSI_LD_CONTEXT}
+        fragments.append(fragment)
+        open_fragments[entity_id] = fragment
+    fragment[context_attr] = reading_attribute(value, timestamp)
+
+def readings_in(fragment):
+    return sum(1 for k in fragment if k not in ("id", "type", "@context"))
+
+def multi_status_failures(fragments, body):
+    # Multi-status: {"success": [ids], "errors": [{"entityId": id, "error": {...}}]}; returns the fragments of
+    # the entities that failed, each with its error
+    errors = {err.get("entityId"): err.get("error", {}) for err in body.get("errors", [])}
+    return [(f, errors[f["id"]]) for f in fragments if f["id"] in errors]
+
+class BatchUpdater:
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, endpoint=BATCH_ENDPOINT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.lock = threading.Lock()
+        self.fragments = []
+        self.open_fragments = {}
+        self.pending = 0
+        self.first_pending_at = None
+        self.stats = {"sent": 0, "failed": 0, "batches": 0, "retried": 0}
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def add(self, room, context, timestamp, value):
+        with self.lock:
+            add_reading(self.fragments, self.open_fragments, room, context.lower(), value, timestamp)
+            self.pending += 1
+            if self.first_pending_at is None:
+                self.first_pending_at = time.monotonic()
+            batch = self._take() if self.pending >= self.batch_size else None
+        if batch:
+            self._send(batch)
+
+    def _take(self):
+        batch, count = self.fragments, self.pending
+        self.fragments, self.open_fragments, self.pending, self.first_pending_at = [], {}, 0, None
+        return batch, count
+
+    def flush(self):
+        with self.lock:
+            batch = self._take() if self.fragments else None
+        if batch:
+            self._send(batch)
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval / 2):
+            with self.lock:
+                due = self.first_pending_at is not None and \
+                    time.monotonic() - self.first_pending_at >= self.flush_interval
+                batch = self._take() if due else None
+            if batch:
+                self._send(batch)
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        self.flush()
+        self.session.close()
+
+    def _post(self, endpoint, fragments):
+        url = f"{ENTITY_OPS_URL}{endpoint}"
+        params = {"options": "update"} if endpoint == "upsert" else None
+        return self.session.post(url, json=fragments, params=params, timeout=10)
+
+    def _send(self, batch):
+        fragments, count = batch
+        with self.lock:
+            self.stats["batches"] += 1
+        readings = {id(f): readings_in(f) for f in fragments}
+        try:
+            r = self._post(self.endpoint, fragments)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Batch {self.endpoint} of {count} readings failed: {e}")
+            self._count(0, count)
+            return
+
+        if r.status_code in (200, 201, 204):
+            self._count(count, 0)
+            return
+        if r.status_code != 207:
+            print(f"❌ Batch {self.endpoint} rejected: {r.status_code} {r.text}")
+            self._count(0, count)
+            return
+
+        failures = []
+        try:
+            failures = multi_status_failures(fragments, r.json())
+        except ValueError as e:
+            print(f"⚠️ Error in decoding multi-status JSON: {e} - Body: {r.text}")
+        self._count(count - sum(readings[id(f)] for f, _ in failures), 0)
+
+        retryable = [f for f, error in failures if self.endpoint == "update" and error.get("status") == 404]
+        for f, error in failures:
+            if f not in retryable:
+                print(f"[{f['type']}] ❌ Batch update failed: {error}")
+                self._count(0, readings[id(f)])
+        if retryable:
+            # Entities that do not exist yet cannot be updated: create them through upsert
+            with self.lock:
+                self.stats["retried"] += len(retryable)
+            try:
+                r_retry = self._post("upsert", retryable)
+                ok = r_retry.status_code in (200, 201, 204)
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Upsert retry failed: {e}")
+                ok = False
+            retried = sum(readings[id(f)] for f in retryable)
+            if ok:
+                self._count(retried, 0)
+            else:
+                self._count(0, retried)
+
+    def _count(self, sent, failed):
+        with self.lock:
+            self.stats["sent"] += sent
+            self.stats["failed"] += failed
+
+def read_measurements(file_path, max_percent=MAX_PERCENT_PER_THREAD):
+    with open(file_path, "r") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return lines[:int(len(lines) * max_percent)]
+
+def simulate_batch(folder="./Measurements", batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                   endpoint=BATCH_ENDPOINT, delay=0.0):
+    files = sorted(glob.glob(os.path.join(folder, "*.csv")))
+    streams = []
+    for file_path in files:
+        room, context = os.path.basename(file_path).replace(".csv", "").split("_", 1)
+        streams.append((room, context, iter(read_measurements(file_path))))
+
+    updater = BatchUpdater(batch_size, flush_interval, endpoint)
+    started = time.perf_counter()
+    queued = 0
+    # Round-robin over every file so each batch mixes readings from all rooms
+    while streams:
+        for stream in list(streams):
+            room, context, lines = stream
+            line = next(lines, None)
+            if line is None:
+                streams.remove(stream)
+                continue
+            parts = line.split("\t")
+            if len(parts) != 2:
+                print(f"[{room}] Line '{line}' malformed")
+                continue
+            updater.add(room, context, datetime.now(timezone.utc), float(parts[1]))
+            queued += 1
+            update_counts[room] = update_counts.get(room, 0) + 1
+            if delay:
+                time.sleep(delay)
+    updater.close()
+
+    elapsed = time.perf_counter() - started
+    stats = updater.stats
+    print(f"📊 {queued} readings in {stats['batches']} batches via /entityOperations/{endpoint}: "
+          f"{stats['sent']} sent, {stats['failed']} failed, {stats['retried']} retried "
+          f"in {elapsed:.2f}s ({stats['sent'] / elapsed:,.0f} updates/sec)")
+    return stats
+
+def iter_file_readings(file_path):
+    # Lazily yields (epoch, room, context, value) so replay memory does not depend on file size
+    filename = os.path.basename(file_path)
+    room, context = filename.replace(".csv", "").split("_", 1)
+    with open(file_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            parts = line.strip().split("\t")
+            if len(parts) != 2:
+                if line.strip():
+                    print(f"[{filename}] Line {line_number} malformed: '{line.strip()}' (2 fields expected)")
+                continue
+            try:
+                yield float(parts[0]), room, context, float(parts[1])
+            except ValueError as e:
+                print(f"[{filename}] Error in parsing line {line_number}: {e}")
+
+def replay(folder="./Measurements", speedup=REPLAY_SPEEDUP, sender="patch", batch_size=BATCH_SIZE,
+           flush_interval=FLUSH_INTERVAL, limit=None):
+    files = sorted(glob.glob(os.path.join(folder, "*.csv")))
+    # k-way merge of the already time-ordered files: only one pending reading per file is held in memory
+    readings = heapq.merge(*(iter_file_readings(f) for f in files), key=lambda reading: reading[0])
+
+    updater = BatchUpdater(batch_size, flush_interval) if sender == "batch" else None
+    started = time.monotonic()
+    first_epoch, sent, max_lag = None, 0, 0.0
+    for epoch, room, context, value in readings:
+        if limit is not None and sent >= limit:
+            break
+        if first_epoch is None:
+            first_epoch = epoch
+        if speedup:
+            # Each reading is due at its original offset from the first one, compressed by the speed-up
+            delay = started + (epoch - first_epoch) / speedup - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+
+        observed_at = datetime.fromtimestamp(epoch, timezone.utc)
+        if updater:
+            updater.add(room, context, observed_at, value)
+            update_counts[room] = update_counts.get(room, 0) + 1
+        else:
+            send_patch(room, context, observed_at, value)
+        sent += 1
+
+    if updater:
+        updater.close()
+    elapsed = time.monotonic() - started
+    speed = f"{speedup:g}x" if speedup else "max speed"
+    print(f"📊 Replayed {sent} readings at {speed} in {elapsed:.2f}s "
+          f"({sent / elapsed if elapsed > 0 else 0:,.0f} readings/sec, max lag behind schedule {max_lag:.3f}s)")
+    return sent
+
+def parse_speedup(value):
+    # "max" disables pacing entirely
+    return None if value == "max" else float(value)
+
 def simulate_file_stream(file_path):
     global last_room
     filename = os.path.basename(file_path)
@@ -214,4 +462,29 @@ def simulate_all(folder="./Measurements"):
             future.result()
 
 if __name__ == "__main__":
-    simulate_all()
+    parser = argparse.ArgumentParser(description="Replay the Measurements CSVs into Orion-LD")
+    parser.add_argument("mode", nargs="?", choices=["stream", "batch", "replay"], default="stream",
+                        help="stream: one PATCH per reading; batch: grouped NGSI-LD entityOperations; "
+                             "replay: all files merged by their original timestamps")
+    parser.add_argument("--folder", default="./Measurements")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="readings per batch request")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="max seconds a reading waits before its batch is sent")
+    parser.add_argument("--endpoint", choices=["upsert", "update"], default=BATCH_ENDPOINT)
+    parser.add_argument("--delay", type=float, default=0.0, help="sleep between readings in batch mode")
+    parser.add_argument("--speedup", type=parse_speedup, default=REPLAY_SPEEDUP,
+                        help="replay speed-up over the original timing (e.g. 1, 100) or 'max'")
+    parser.add_argument("--sender", choices=["patch", "batch"], default="patch",
+                        help="replay through one PATCH per reading or through batched entityOperations")
+    parser.add_argument("--limit", type=int, help="stop the replay after this many readings")
+    parser.add_argument("--trace", action="store_true",
+                        help="stamp sentAt/traceId into every reading for end-to-end latency tracing")
+    args = parser.parse_args()
+    TRACE_READINGS = args.trace
+
+    if args.mode == "replay":
+        replay(args.folder, args.speedup, args.sender, args.batch_size, args.flush_interval, args.limit)
+    elif args.mode == "batch":
+        simulate_batch(args.folder, args.batch_size, args.flush_interval, args.endpoint, args.delay)
+    else:
+        simulate_all(args.folder)
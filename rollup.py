@@ -0,0 +1,107 @@
+import threading
+
+from codec import DOUBLE, LONG
+
+ROLLUP_TABLE = "hourly_rollup"
+ROLLUP_FLUSH_SECONDS = 5
+SENSORS = ("temperature", "humidity", "brightness")
+# HBase counters are 64-bit integers, so sums are kept in thousandths of the sensor unit
+SUM_SCALE = 1000
+
+def rollup_rowkey(room, hour):
+    # e.g. b"kitchen_2026-10-18 14": one row per room and local hour, sorted by room then time
+    return f"{room}_{hour}".encode()
+
+def merge_cell(cell, count, total, low, high):
+    if cell is None:
+        return [count, total, low, high]
+    cell[0] += count
+    cell[1] += total
+    cell[2] = min(cell[2], low)
+    cell[3] = max(cell[3], high)
+    return cell
+
+class RollupAccumulator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cells = {}
+
+    def add(self, room, hour, sensor, value):
+        value = float(value)
+        key = (room, hour, sensor)
+        with self.lock:
+            self.cells[key] = merge_cell(self.cells.get(key), 1, value, value, value)
+
+    def add_frame(self, room, hours, sensor, values):
+        grouped = values.astype(float).groupby(hours.to_numpy()).agg(["count", "sum", "min", "max"])
+        columns = zip(grouped.index, grouped["count"].to_numpy(), grouped["sum"].to_numpy(),
+                      grouped["min"].to_numpy(), grouped["max"].to_numpy())
+        with self.lock:
+            for hour, count, total, low, high in columns:
+                key = (room, hour, sensor)
+                self.cells[key] = merge_cell(self.cells.get(key), int(count), float(total), float(low), float(high))
+
+    def merge(self, cells):
+        with self.lock:
+            for key, (count, total, low, high) in cells.items():
+                self.cells[key] = merge_cell(self.cells.get(key), count, total, low, high)
+
+    def drain(self):
+        with self.lock:
+            cells, self.cells = self.cells, {}
+        return cells
+
+    def __len__(self):
+        with self.lock:
+            return len(self.cells)
+
+def flush_rollups(connection, cells, exclusive=False):
+    # exclusive=True means no other writer touches these rows concurrently (e.g. a bulk load into freshly
+    # reset tables): count and sum then go through the same batched upsert as min/max instead of one
+    # counter RPC each.
+    # Without it, each count and sum applied is zeroed in cells, so after a failure the caller can merge cells
+    # back and the retry only adds what is still missing (re-upserting min/max is harmless)
+    if not cells:
+        return 0
+    table = connection.table(ROLLUP_TABLE.encode())
+
+    # min/max cannot be incremented: read the current extremes of every touched row and upsert in one batch
+    rowkeys = sorted({rollup_rowkey(room, hour) for room, hour, _ in cells})
+    current = dict(table.rows(rowkeys))
+    with table.batch() as batch:
+        for (room, hour, sensor), (count, total, low, high) in cells.items():
+            rowkey = rollup_rowkey(room, hour)
+            stored = current.get(rowkey, {})
+            min_col, max_col = f"cf:{sensor}_min".encode(), f"cf:{sensor}_max".encode()
+            if min_col in stored:
+                low = min(low, DOUBLE.unpack(stored[min_col])[0])
+            if max_col in stored:
+                high = max(high, DOUBLE.unpack(stored[max_col])[0])
+            data = {
+                b'cf:room': room.encode(),
+                b'cf:hour': hour.encode(),
+                min_col: DOUBLE.pack(low),
+                max_col: DOUBLE.pack(high),
+            }
+            if exclusive:
+                # Counters are plain 8-byte big-endian longs, so writing one is the same as setting it
+                count_col, sum_col = f"cf:{sensor}_count".encode(), f"cf:{sensor}_sum".encode()
+                count += LONG.unpack(stored[count_col])[0] if count_col in stored else 0
+                scaled = int(round(total * SUM_SCALE))
+                scaled += LONG.unpack(stored[sum_col])[0] if sum_col in stored else 0
+                data[count_col] = LONG.pack(count)
+                data[sum_col] = LONG.pack(scaled)
+            batch.put(rowkey, data)
+
+    if not exclusive:
+        # count and sum are atomic counters, so concurrent writers can add to the same hour safely
+        for (room, hour, sensor), cell in cells.items():
+            rowkey = rollup_rowkey(room, hour)
+            if cell[0]:
+                table.counter_inc(rowkey, f"cf:{sensor}_count".encode(), cell[0])
+                cell[0] = 0
+            scaled = int(round(cell[1] * SUM_SCALE))
+            if scaled:
+                table.counter_inc(rowkey, f"cf:{sensor}_sum".encode(), scaled)
+            cell[1] = 0
+    return len(cells)
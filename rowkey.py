@@ -0,0 +1,132 @@
+import time
+import zlib
+import heapq
+import struct
+import argparse
+import numpy as np
+import happybase
+
+SALT_BUCKETS = 16
+ROWKEY_CODEC = "salted"
+
+# salt (1 byte) | epoch millis (8 bytes, big-endian) | entity id
+KEY_PREFIX = struct.Struct(">BQ")
+KEY_PREFIX_DTYPE = np.dtype([("salt", "u1"), ("ts", ">u8")])
+GOLDEN_RATIO_64 = np.uint64(0x9E3779B97F4A7C15)
+
+def _mix(ts_millis):
+    # Fibonacci hashing spreads consecutive timestamps evenly over the buckets
+    with np.errstate(over="ignore"):
+        return (np.asarray(ts_millis, dtype=np.uint64) * GOLDEN_RATIO_64) >> np.uint64(40)
+
+class SaltedTimeKeyCodec:
+    name = "salted"
+
+    def __init__(self, buckets=SALT_BUCKETS):
+        self.buckets = buckets
+
+    def salt(self, entity, ts_millis):
+        return int((zlib.crc32(entity.encode()) ^ int(_mix(ts_millis))) % self.buckets)
+
+    def encode(self, entity, ts_millis):
+        ts_millis = int(ts_millis)
+        return KEY_PREFIX.pack(self.salt(entity, ts_millis), ts_millis) + entity.encode()
+
+    def encode_many(self, entity, ts_millis):
+        ts_millis = np.asarray(ts_millis, dtype=np.uint64)
+        prefixes = np.empty(len(ts_millis), dtype=KEY_PREFIX_DTYPE)
+        prefixes["salt"] = (np.uint64(zlib.crc32(entity.encode())) ^ _mix(ts_millis)) % np.uint64(self.buckets)
+        prefixes["ts"] = ts_millis
+        raw, width, suffix = prefixes.tobytes(), KEY_PREFIX.size, entity.encode()
+        return [raw[i:i + width] + suffix for i in range(0, len(raw), width)]
+
+    def decode(self, rowkey):
+        salt, ts_millis = KEY_PREFIX.unpack_from(rowkey)
+        return rowkey[KEY_PREFIX.size:].decode(), ts_millis
+
+    def scan_ranges(self, start_millis, stop_millis):
+        # One contiguous [start, stop) key range per salt bucket
+        return [(KEY_PREFIX.pack(salt, int(start_millis)), KEY_PREFIX.pack(salt, int(stop_millis)))
+                for salt in range(self.buckets)]
+
+    def key_ranges(self):
+        # The whole table split into one [start, stop) range per salt bucket, for parallel full scans
+        return [(bytes([salt]), bytes([salt + 1]) if salt + 1 < 256 else None) for salt in range(self.buckets)]
+
+    def split_keys(self, regions=None):
+        # Region boundaries on salt bytes: every region takes an equal share of the writes from the first row on.
+        # Finer splits would cut a bucket by time, and new rows would all land in the last region of each bucket.
+        regions = min(regions or self.buckets, self.buckets)
+        return [bytes([round(i * self.buckets / regions)]) for i in range(1, regions)]
+
+class LegacyKeyCodec:
+    name = "legacy"
+    buckets = 1
+
+    def encode(self, entity, ts_millis):
+        ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(ts_millis) / 1000))
+        return f"{entity}_{ts}".encode()
+
+    def encode_many(self, entity, ts_millis):
+        return [self.encode(entity, ts) for ts in ts_millis]
+
+    def decode(self, rowkey):
+        entity, ts = rowkey.decode().rsplit("_", 1)
+        return entity, int(time.mktime(time.strptime(ts, '%Y-%m-%d %H:%M:%S')) * 1000)
+
+    def scan_ranges(self, start_millis, stop_millis):
+        # Keys do not sort by time: the whole table has to be scanned and filtered
+        return [(None, None)]
+
+    def key_ranges(self):
+        return [(None, None)]
+
+    def split_keys(self, regions=None):
+        # Every key of a table starts with the same entity id, so there is nothing to split on
+        return []
+
+CODECS = {
+    SaltedTimeKeyCodec.name: SaltedTimeKeyCodec,
+    LegacyKeyCodec.name: LegacyKeyCodec,
+}
+
+def get_codec(name=None, **kwargs):
+    return CODECS[name or ROWKEY_CODEC](**kwargs)
+
+def scan_time_range(table, start_millis, stop_millis, codec=None, columns=None, batch_size=1000):
+    codec = codec or get_codec()
+    scans = []
+    for row_start, row_stop in codec.scan_ranges(start_millis, stop_millis):
+        scans.append(_scan_bucket(table, codec, row_start, row_stop, start_millis, stop_millis,
+                                  columns, batch_size))
+    # Each bucket is already time-ordered, so a k-way merge yields the window in order
+    yield from heapq.merge(*scans, key=lambda item: item[0])
+
+def _scan_bucket(table, codec, row_start, row_stop, start_millis, stop_millis, columns, batch_size):
+    for rowkey, data in table.scan(row_start=row_start, row_stop=row_stop, columns=columns,
+                                   batch_size=batch_size):
+        _, ts_millis = codec.decode(rowkey)
+        if start_millis <= ts_millis < stop_millis:
+            yield ts_millis, rowkey, data
+
+def scan_recent(table, seconds, codec=None, columns=None):
+    now_millis = int(time.time() * 1000)
+    return scan_time_range(table, now_millis - int(seconds * 1000), now_millis + 1, codec, columns)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bounded time-window scan over a salted *_data table")
+    parser.add_argument("table")
+    parser.add_argument("--seconds", type=float, default=3600, help="size of the trailing window")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--codec", default=ROWKEY_CODEC, choices=sorted(CODECS))
+    args = parser.parse_args()
+
+    connection = happybase.Connection(args.host)
+    table = connection.table(args.table.encode())
+    started = time.perf_counter()
+    count = 0
+    for ts_millis, rowkey, data in scan_recent(table, args.seconds, get_codec(args.codec)):
+        count += 1
+    elapsed = time.perf_counter() - started
+    print(f"🔎 {count} rows in the last {args.seconds:.0f}s of {args.table} ({elapsed:.3f}s)")
+    connection.close()
@@ -1,14 +1,30 @@
 from flask import Flask, request, jsonify
 import requests, json
 import happybase
-from thriftpy2.thrift import TApplicationException
+from thriftpy2.thrift import TApplicationException, TException
 import threading
+import socket
+import logging
+import argparse
+import random
 from datetime import datetime
 import queue
 import time
+import atexit
 from collections import defaultdict
+from contextlib import contextmanager
+from rowkey import get_codec
+from codec import encode_value, decode_value, encode_millis, decode_millis
+from tracing import TraceLog, RECEIVED_KEY, now_millis
+from rollup import RollupAccumulator, ROLLUP_TABLE, ROLLUP_FLUSH_SECONDS, SENSORS, flush_rollups
+from metrics import Registry, CONTENT_TYPE, setup_logging
+from wal import SegmentLog, WAL_SEGMENT_MB, WAL_MAX_MB, WAL_SYNC_MS
+from provision import RegionMap, load_table_config, create_table
+from watermark import (WatermarkTracker, WATERMARK_TABLE, WATERMARK_FLUSH_SECONDS, ensure_watermark_table,
+                       advance_watermarks)
 
 app = Flask(__name__)
+log = logging.getLogger("subscriber")
 
 ORION_LD_HOST = "http://127.0.0.1:1026"
 SUBS_URL = f"{ORION_LD_HOST}/ngsi-ld/v1/subscriptions"
@@ -17,10 +33,36 @@ SUB_ID = "urn:ngsi-ld:Subscription:KitchenUpdates"
 
 HBASE_HOST = "localhost"
 HBASE_TABLE = "kitchen_data"
+HBASE_TABLES = ['kitchen_data', 'room1_data', 'room2_data', 'room3_data', 'bathroom_data', 'toilet_data']
+WRITER_THREADS = 3
+# rollup_flusher and watermark_flusher also write through the pool
+FLUSHER_THREADS = 2
+ROW_KEY_CODEC = get_codec()
+WRITE_BATCH_SIZE = 500
+WRITE_BATCH_TIMEOUT_MS = 50
 
-write_buffer = queue.Queue()
-last_sent = defaultdict(lambda: 0.0)
-delay_seconds = 0.05
+WRITE_BUFFER_SIZE = 10000
+LOG_SAMPLE_RATE = 0.001
+BUSY_STATUS = 429
+RETRY_AFTER_SECONDS = 1
+RETRY_BASE_SECONDS = 0.1
+RETRY_MAX_SECONDS = 10.0
+LOG_LEVEL = "INFO"
+# Errors after which happybase's pool replaces the Thrift client, if they leave its connection() block
+THRIFT_ERRORS = (TException, socket.error)
+
+write_buffer = queue.Queue(maxsize=WRITE_BUFFER_SIZE)
+# With --wal-dir, notifications go to a durable segment log on disk instead of write_buffer
+wal = None
+rollups = RollupAccumulator()
+watermarks = WatermarkTracker()
+table_regions = RegionMap()
+# Regions and column family options of the *_data tables (--table-config); None creates them unsplit
+table_config = load_table_config()
+trace_log = None
+enqueue_lock = threading.Lock()
+# Set in the receiver processes of workers.py: takes the stamped entities instead of the local buffer
+forward = None
 
 payload = {
     "id": SUB_ID,
@@ -42,103 +84,487 @@ payload = {
     "@context": "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"
 }
 
+hbase_pool = None
+known_tables = set()
+known_tables_lock = threading.Lock()
+pool_stats = {"opened": 0, "reused": 0}
+pool_stats_lock = threading.Lock()
+seen_connections = set()
+
+registry = Registry()
+notifications_total = registry.counter("subscriber_notifications_total", "Notifications by outcome", ("outcome",))
+entities_received_total = registry.counter("subscriber_entities_received_total", "Entities received in notifications")
+entities_coalesced_total = registry.counter("subscriber_entities_coalesced_total",
+                                            "Partial updates merged into another row of the same batch")
+hbase_puts_total = registry.counter("subscriber_hbase_puts_total", "Rows written to HBase", ("table",))
+hbase_batches_total = registry.counter("subscriber_hbase_batches_total", "HBase put/batch calls", ("table",))
+hbase_write_seconds = registry.histogram("subscriber_hbase_write_seconds", "HBase put/batch latency", ("table",))
+queue_wait_seconds = registry.histogram("subscriber_queue_wait_seconds",
+                                        "Time the oldest entity of each drained batch spent in write_buffer")
+errors_total = registry.counter("subscriber_errors_total", "Errors by pipeline stage", ("stage",))
+registry.gauge("subscriber_write_buffer_depth", "Entities waiting in write_buffer (or the WAL)",
+               lambda: buffer_depth())
+registry.gauge("subscriber_wal_bytes", "Disk used by WAL segments", lambda: wal.size_bytes() if wal else 0)
+write_retries_total = registry.counter("subscriber_write_retries_total", "HBase write attempts retried after a failure")
+registry.gauge("subscriber_write_buffer_capacity", "write_buffer maxsize", lambda: write_buffer.maxsize)
+registry.gauge("subscriber_rollup_cells_pending", "Hourly rollup cells waiting for the next flush",
+               lambda: len(rollups))
+registry.gauge("subscriber_hbase_connections", "Pooled HBase connection checkouts by kind",
+               lambda: connection_checkouts(), ("kind",))
+
+def connection_checkouts():
+    with pool_stats_lock:
+        return {(kind,): count for kind, count in pool_stats.items()}
+
+def init_hbase_pool(size=WRITER_THREADS):
+    global hbase_pool
+    hbase_pool = happybase.ConnectionPool(size=size, host=HBASE_HOST)
+    return hbase_pool
+
+@contextmanager
+def hbase_connection():
+    with hbase_pool.connection() as connection:
+        with pool_stats_lock:
+            if id(connection) in seen_connections:
+                pool_stats["reused"] += 1
+            else:
+                seen_connections.add(id(connection))
+                pool_stats["opened"] += 1
+        try:
+            yield connection
+        except Exception:
+            # The pool refreshes the Thrift client of a tainted connection,
+            # so the next checkout counts as a newly opened one.
+            with pool_stats_lock:
+                seen_connections.discard(id(connection))
+            raise
+
+def ensure_table(connection, table_name):
+    if table_name in known_tables:
+        return
+    with known_tables_lock:
+        if table_name in known_tables:
+            return
+        try:
+            if table_name in HBASE_TABLES and table_config is not None:
+                regions = create_table(connection, table_name, table_config, ROW_KEY_CODEC)
+            else:
+                connection.create_table(table_name, {'cf': dict()})
+                regions = 1
+            log.info("✅ Created table: %s (%d regions)", table_name, regions)
+        except Exception as e:
+            if "TableExistsException" in str(e) or "already in use" in str(e):
+                log.info("⚠️ Table already exists: %s", table_name)
+            else:
+                log.error("⚠️ Table creation failed: %s", e)
+                errors_total.inc(1, "create_table")
+                return
+        known_tables.add(table_name)
+
+def ensure_tables(table_names):
+    with hbase_connection() as connection:
+        existing = {t.decode() for t in connection.tables()}
+        with known_tables_lock:
+            known_tables.update(existing & set(table_names))
+        for table_name in table_names:
+            ensure_table(connection, table_name)
+
+def buffer_depth():
+    return wal.depth() if wal is not None else write_buffer.qsize()
+
+def buffer_idle():
+    # True once every buffered entity has been written (or given up on), not merely dequeued
+    return wal.idle() if wal is not None else write_buffer.unfinished_tasks == 0
+
 def setup_subscription():
     try:
         requests.delete(f"{SUBS_URL}/{SUB_ID}", timeout=5)
     except:
         pass
     r = requests.post(SUBS_URL, json=payload, headers={"Content-Type":"application/ld+json"}, timeout=5)
-    print("Subscription:", r.status_code, r.text)
+    log.info("Subscription: %s %s", r.status_code, r.text)
 
-def write_to_hbase(entity):
-    try:
-        eid = entity["id"]
-        entity_type = entity["type"].lower()
-        table_name = f"{entity_type}_data"
-        temperature = entity.get("temperature", {}).get("value")
-        humidity = entity.get("humidity", {}).get("value")
-        brightness = entity.get("brightness", {}).get("value")
+def build_row(entity):
+    eid = entity["id"]
+    entity_type = entity["type"].lower()
+    table_name = f"{entity_type}_data"
 
-        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # The receive time, not the write time, so a retried or replayed entity overwrites the same row
+    received = entity.get(RECEIVED_KEY)
+    ts_millis = int(received if received is not None else time.time() * 1000)
 
-        connection = happybase.Connection(host=HBASE_HOST)
+    rowkey = ROW_KEY_CODEC.encode(eid, ts_millis)
+    data_dict = {b'cf:entity': eid.encode()}
+
+    for sensor in SENSORS:
+        value = entity.get(sensor, {}).get("value")
+        if value is not None:
+            data_dict[f"cf:{sensor}".encode()] = encode_value(sensor, value)
+    data_dict[b'cf:timestamp'] = encode_millis(ts_millis)
+
+    return table_name, rowkey, data_dict
+
+def coalesce_entities(entities):
+    # Merges the partial updates of each entity within a drained batch (i.e. within --batch-timeout-ms) into one
+    # wide row: the newest value of every attribute wins and the row takes the latest receive time. The state is
+    # local to the batch, so it is bounded by --batch-size and never shared between writer threads.
+    merged = {}
+    for entity in entities:
+        current = merged.get(entity.get("id"))
+        if current is None:
+            merged[entity.get("id")] = dict(entity)
+        else:
+            current.update(entity)
+    if len(merged) < len(entities):
+        entities_coalesced_total.inc(len(entities) - len(merged))
+    return list(merged.values())
+
+def record_rollups(table_name, data_dict):
+    room = table_name[:-len("_data")]
+    hour = datetime.fromtimestamp(decode_millis(data_dict[b'cf:timestamp']) / 1000).strftime('%Y-%m-%d %H')
+    for sensor in SENSORS:
+        value = data_dict.get(f"cf:{sensor}".encode())
+        if value is not None:
+            rollups.add(room, hour, sensor, decode_value(sensor, value))
+
+def rollup_flusher():
+    while True:
+        time.sleep(ROLLUP_FLUSH_SECONDS)
+        cells = rollups.drain()
+        if not cells:
+            continue
         try:
-            connection.create_table(
-                table_name,
-                {'cf': dict()}  # column family 'cf'
-            )
-            print(f"✅ Created table: {table_name}")
+            with hbase_connection() as connection:
+                flush_rollups(connection, cells)
+            watermarks.mark(ROLLUP_TABLE)
+            log.debug("📈 Flushed %d hourly rollup cells", len(cells))
         except Exception as e:
-            if "TableExistsException" in str(e) or "already in use" in str(e):
-                print(f"⚠️ Table already exists: {table_name}")
-            else:
-                print(f"⚠️ Table creation failed: {e}")
+            log.error("❌ Rollup flush failed: %s", e)
+            errors_total.inc(1, "rollup")
+            # flush_rollups zeroed the counts and sums it applied, so only the rest is added again
+            rollups.merge(cells)
 
-        table = connection.table(table_name.encode())
-
-        rowkey = f"{eid}_{ts}".encode()
-        data_dict = {}
+def watermark_flusher():
+    # Lets cached Hive results over the tables written since the last flush be invalidated
+    while True:
+        time.sleep(WATERMARK_FLUSH_SECONDS)
+        try:
+            with hbase_connection() as connection:
+                watermarks.flush(connection)
+        except Exception as e:
+            log.error("❌ Watermark flush failed: %s", e)
+            errors_total.inc(1, "watermark")
 
-        if temperature is not None:
-            data_dict[b'cf:temperature'] = str(temperature).encode()
-        if humidity is not None:
-            data_dict[b'cf:humidity'] = str(humidity).encode()
-        if brightness is not None:
-            data_dict[b'cf:brightness'] = str(brightness).encode()
-        data_dict[b'cf:timestamp'] = ts.encode()
+def build_rows(entities):
+    # Malformed entities are dropped and counted once, here, on both write paths: no retry can fix them
+    rows = []
+    for entity in entities:
+        try:
+            table_name, rowkey, data_dict = build_row(entity)
+        except Exception as e:
+            log.warning("❌ Malformed entity %s: %s", entity.get('id'), e)
+            errors_total.inc(1, "build_row")
+            continue
+        rows.append((table_name, rowkey, data_dict, entity))
+    return rows
 
-        table.put(rowkey, data_dict)
-        connection.close()
-        print("✅ Inserted into HBase")
+def write_to_hbase(row, dequeued=None):
+    # Returns [row] if the put failed
+    table_name, rowkey, data_dict, entity = row
+    try:
+        with hbase_connection() as connection:
+            ensure_table(connection, table_name)
+            started = time.perf_counter()
+            connection.table(table_name.encode()).put(rowkey, data_dict)
+            hbase_write_seconds.observe(time.perf_counter() - started, table_name)
+        hbase_puts_total.inc(1, table_name)
+        hbase_batches_total.inc(1, table_name)
+        watermarks.mark(table_name)
+        if trace_log:
+            trace_log.record([entity], dequeued, now_millis())
+        record_rollups(table_name, data_dict)
+        log.debug("✅ Inserted into %s", table_name)
 
     except Exception as e:
-        print(f"❌ HBase insert failed: {e}")
+        log.error("❌ HBase insert failed: %s", e)
+        errors_total.inc(1, "hbase_put")
+        return [row]
+    return []
+
+def write_batch_to_hbase(rows, dequeued=None):
+    # Returns the rows whose table or region batch failed
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[0]].append(row)
+
+    failed, broken = [], None
+    try:
+        with hbase_connection() as connection:
+            for table_name, table_rows in grouped.items():
+                if broken is not None:
+                    failed.extend(table_rows)
+                    continue
+                try:
+                    ensure_table(connection, table_name)
+                    # One batch per table, or per region while the table has recently failed
+                    region_batches = table_regions.split(connection, table_name, table_rows, key=lambda r: r[1])
+                except Exception as e:
+                    log.error("❌ HBase batch insert into %s failed: %s", table_name, e)
+                    errors_total.inc(1, "hbase_batch")
+                    failed.extend(table_rows)
+                    if isinstance(e, THRIFT_ERRORS):
+                        broken = e
+                    continue
+                for region_rows in region_batches:
+                    if broken is not None:
+                        failed.extend(region_rows)
+                        continue
+                    try:
+                        started = time.perf_counter()
+                        with connection.table(table_name.encode()).batch() as batch:
+                            for _, rowkey, data_dict, _ in region_rows:
+                                batch.put(rowkey, data_dict)
+                        hbase_write_seconds.observe(time.perf_counter() - started, table_name)
+                        hbase_puts_total.inc(len(region_rows), table_name)
+                        hbase_batches_total.inc(1, table_name)
+                        watermarks.mark(table_name)
+                        if trace_log:
+                            trace_log.record([entity for *_, entity in region_rows], dequeued, now_millis())
+                        for _, _, data_dict, _ in region_rows:
+                            record_rollups(table_name, data_dict)
+                        log.debug("✅ Inserted %d rows into %s", len(region_rows), table_name)
+                    except Exception as e:
+                        log.error("❌ HBase batch insert into %s failed: %s", table_name, e)
+                        errors_total.inc(1, "hbase_batch")
+                        table_regions.mark_failed(table_name)
+                        failed.extend(region_rows)
+                        if isinstance(e, THRIFT_ERRORS):
+                            broken = e
+            if broken is not None:
+                # The socket may be dead: raising inside the pool's block makes happybase replace the Thrift
+                # client, otherwise every retry would reuse the same broken connection
+                raise broken
+    except THRIFT_ERRORS:
+        if broken is None:
+            raise
+    return failed
+
+def write_with_retry(entities, dequeued=None):
+    # Nothing well-formed is dropped on HBase errors: the failed part is retried with exponential backoff until
+    # it lands. Meanwhile this writer takes no new work, so the buffer (and then /notify) pushes back instead.
+    rows = build_rows(entities)
+    delay = RETRY_BASE_SECONDS
+    while rows:
+        try:
+            if len(rows) == 1:
+                rows = write_to_hbase(rows[0], dequeued)
+            else:
+                rows = write_batch_to_hbase(rows, dequeued)
+        except Exception as e:
+            log.error("❌ HBase insert failed: %s", e)
+            errors_total.inc(1, "writer")
+        if rows:
+            write_retries_total.inc()
+            log.warning("🔁 Retrying %d entities in %.1fs", len(rows), delay)
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+def drain_write_buffer(max_items, max_wait):
+    entities = [write_buffer.get()]
+    deadline = time.monotonic() + max_wait
+    while len(entities) < max_items:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            entities.append(write_buffer.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return entities
 
 def hbase_writer(worker_id):
     while True:
-        entity = write_buffer.get()
-        print(f"🔧 [Worker {worker_id}] Processing entity: {entity.get('id')}")
-        write_to_hbase(entity)
-        write_buffer.task_done()
+        if wal is not None:
+            token, entities = wal.read(WRITE_BATCH_SIZE, WRITE_BATCH_TIMEOUT_MS / 1000)
+            if not entities:
+                wal.ack(token)
+                continue
+        else:
+            entities = drain_write_buffer(WRITE_BATCH_SIZE, WRITE_BATCH_TIMEOUT_MS / 1000)
+        dequeued = now_millis()
+        oldest = min(entity.get(RECEIVED_KEY, dequeued) for entity in entities)
+        queue_wait_seconds.observe((dequeued - oldest) / 1000)
+        rows = coalesce_entities(entities)
+        log.debug("🔧 [Worker %d] Processing %d entities as %d rows", worker_id, len(entities), len(rows))
+        if wal is not None:
+            # Acknowledged only once written, so a crash before that replays the batch on restart
+            write_with_retry(rows, dequeued)
+            wal.ack(token)
+            continue
+        try:
+            write_with_retry(rows, dequeued)
+        finally:
+            for _ in entities:
+                write_buffer.task_done()
+
+def log_notification(data):
+    if LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE:
+        log.info("📥 Notification received (sampled): %s", json.dumps(data))
+
+def enqueue_notification(data):
+    entities = data["data"]
+    received = time.time() * 1000
+    for entity in entities:
+        if "id" not in entity or "type" not in entity:
+            raise ValueError("entity without id or type")
+        # Row key time, and also feeds subscriber_queue_wait_seconds, so it is stamped even without a trace log
+        entity[RECEIVED_KEY] = received
+    accepted = entities
+    if forward is not None:
+        # Receiver process of workers.py: the writer processes own the buffers
+        forward(accepted)
+    else:
+        buffer_entities(accepted)
+    # Only counted once buffered: a 429 rejects the whole notification
+    entities_received_total.inc(len(accepted))
+    return len(accepted)
+
+def buffer_entities(entities):
+    # Every update is kept: repeated updates of an entity are merged by coalesce_entities() on the write side
+    with enqueue_lock:
+        if wal is not None:
+            # All-or-nothing append; raises queue.Full once the log reaches --wal-max-mb
+            wal.append_many(entities)
+            return
+
+        # Writers only ever take items out, so checking the free space while
+        # holding the producer lock guarantees the puts below never block.
+        if write_buffer.maxsize > 0 and write_buffer.qsize() + len(entities) > write_buffer.maxsize:
+            raise queue.Full
+
+        for entity in entities:
+            write_buffer.put_nowait(entity)
 
 @app.route("/notify", methods=["POST"])
 def notify():
     data = request.get_json(force=True)
-    print("📥 Notification received:", json.dumps(data, indent=2))
+    log_notification(data)
 
     # Estraggo i dati
     try:
-        current_time = time.time()
-        for entity in data["data"]:
-            eid = entity["id"]
-            if current_time - last_sent[eid] >= delay_seconds:
-                write_buffer.put(entity)
-                last_sent[eid] = current_time
-            else:
-                print(f"⏳ Skipping {eid} to respect 4s interval")
-
+        enqueue_notification(data)
+    except queue.Full:
+        notifications_total.inc(1, "rejected")
+        log.warning("🚦 write_buffer full (%d), rejecting notification", buffer_depth())
+        return jsonify({"status": "busy"}), BUSY_STATUS, {"Retry-After": str(RETRY_AFTER_SECONDS)}
     except Exception as e:
-        print(f"❌ HBase insert failed: {e}")
+        notifications_total.inc(1, "invalid")
+        log.warning("❌ Malformed notification: %s", e)
+        return jsonify({"status": "invalid"}), 400
 
+    notifications_total.inc(1, "accepted")
     return jsonify({"status": "received"}), 200
 
-if __name__ == "__main__":
+@app.route("/stats", methods=["GET"])
+def stats():
+    with pool_stats_lock:
+        return jsonify({"connections": dict(pool_stats), "known_tables": sorted(known_tables),
+                        "write_buffer": buffer_depth(), "wal": wal.stats if wal else None}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return registry.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+def build_arg_parser(description="Orion-LD notification subscriber writing to HBase"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--writers", type=int, default=WRITER_THREADS, help="number of hbase_writer threads")
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE, help="max entities per HBase batch")
+    parser.add_argument("--batch-timeout-ms", type=float, default=WRITE_BATCH_TIMEOUT_MS,
+                        help="max time to wait for a batch to fill")
+    parser.add_argument("--queue-size", type=int, default=WRITE_BUFFER_SIZE,
+                        help="max entities held in write_buffer before notifications are rejected")
+    parser.add_argument("--log-sample-rate", type=float, default=LOG_SAMPLE_RATE,
+                        help="fraction of notification payloads to log")
+    parser.add_argument("--trace-log", help="append per-reading receive/dequeue/write times to this JSONL file")
+    parser.add_argument("--wal-dir", help="buffer notifications in a durable segment log here instead of in RAM; "
+                                           "the existing tables are then kept on start instead of reset")
+    parser.add_argument("--wal-segment-mb", type=int, default=WAL_SEGMENT_MB, help="size of each WAL segment file")
+    parser.add_argument("--wal-max-mb", type=int, default=WAL_MAX_MB,
+                        help="disk the WAL may use before notifications are rejected")
+    parser.add_argument("--wal-sync-ms", type=int, default=WAL_SYNC_MS,
+                        help="interval between msync/checkpoint writes; 0 syncs on every notification")
+    parser.add_argument("--retry-base", type=float, default=RETRY_BASE_SECONDS,
+                        help="first backoff after a failed HBase write, doubled on every retry")
+    parser.add_argument("--retry-max", type=float, default=RETRY_MAX_SECONDS, help="backoff cap")
+    parser.add_argument("--table-config", help="JSON file with the regions and column family options of new tables; "
+                                                 "without it they are created as a single region")
+    parser.add_argument("--log-level", default=LOG_LEVEL, choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG logs every insert; repeated messages are rate-limited either way")
+    return parser
+
+def configure(args):
+    global WRITER_THREADS, WRITE_BATCH_SIZE, WRITE_BATCH_TIMEOUT_MS, WRITE_BUFFER_SIZE, LOG_SAMPLE_RATE, write_buffer
+    global trace_log, LOG_LEVEL, wal, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, table_config
+    WRITER_THREADS = args.writers
+    WRITE_BATCH_SIZE = args.batch_size
+    WRITE_BATCH_TIMEOUT_MS = args.batch_timeout_ms
+    WRITE_BUFFER_SIZE = args.queue_size
+    LOG_SAMPLE_RATE = args.log_sample_rate
+    write_buffer = queue.Queue(maxsize=WRITE_BUFFER_SIZE)
+    trace_log = TraceLog(args.trace_log) if args.trace_log else None
+    LOG_LEVEL = args.log_level
+    setup_logging(LOG_LEVEL)
+    RETRY_BASE_SECONDS = args.retry_base
+    RETRY_MAX_SECONDS = args.retry_max
+    table_config = load_table_config(args.table_config)
+    if args.wal_dir:
+        wal = SegmentLog(args.wal_dir, args.wal_segment_mb, args.wal_max_mb, args.wal_sync_ms)
+        atexit.register(wal.close)
+        if wal.stats["recovered"]:
+            log.info("♻️ Replaying %d entities from %s", wal.stats["recovered"], args.wal_dir)
+
+def reset_tables():
     # Clean up all relevant tables if they exist before starting
     try:
         connection = happybase.Connection(host=HBASE_HOST)
-        for table_name in [b'kitchen_data', b'room1_data', b'room2_data', b'room3_data', b'bathroom_data', b'toilet_data']:
+        for table_name in [t.encode() for t in HBASE_TABLES + [ROLLUP_TABLE]]:
             if table_name in connection.tables():
                 connection.delete_table(table_name, disable=True)
-                print(f"🧹 Deleted existing table: {table_name.decode()}")
+                log.info("🧹 Deleted existing table: %s", table_name.decode())
+        ensure_watermark_table(connection)
+        advance_watermarks(connection, HBASE_TABLES + [ROLLUP_TABLE])
         connection.close()
     except Exception as e:
-        print(f"❌ Failed to clean up existing table: {e}")
+        log.error("❌ Failed to clean up existing table: %s", e)
+
+def reset_tables_on_start(args):
+    # The WAL replays its unacknowledged tail into the tables that already hold everything acknowledged before
+    # the restart, so they are only wiped when notifications are buffered in RAM
+    if args.wal_dir:
+        log.info("💾 WAL in %s: keeping the existing tables", args.wal_dir)
+        return
+    reset_tables()
+
+def start_writers():
+    # One connection per writer plus one per flusher, so a flush never waits for a writer's connection
+    init_hbase_pool(WRITER_THREADS + FLUSHER_THREADS)
+    ensure_tables(HBASE_TABLES + [ROLLUP_TABLE, WATERMARK_TABLE])
 
     writer_threads = []
-    for i in range(3):  # Start 3 worker threads
+    for i in range(WRITER_THREADS):  # Start one worker thread per pooled connection
         t = threading.Thread(target=hbase_writer, args=(i,), daemon=True)
         t.start()
         writer_threads.append(t)
+    threading.Thread(target=rollup_flusher, daemon=True).start()
+    threading.Thread(target=watermark_flusher, daemon=True).start()
+    return writer_threads
 
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    configure(args)
+    reset_tables_on_start(args)
+    start_writers()
     setup_subscription()
-    app.run(host="0.0.0.0", port=8000)
+    app.run(host=args.host, port=args.port)
@@ -0,0 +1,70 @@
+import json
+import math
+import argparse
+
+import benchmark
+
+# stage name -> (start field, end field), all epoch millis
+STAGES = {
+    "orion_notification": ("sent", "received"),
+    "queue_wait": ("received", "dequeued"),
+    "hbase_write": ("dequeued", "written"),
+    "end_to_end": ("sent", "written"),
+}
+BAR_WIDTH = 40
+
+def load_traces(path):
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                print(f"⚠️ Skipping malformed trace line {line_number}: {e}")
+
+def stage_latencies(traces):
+    latencies = {stage: [] for stage in STAGES}
+    for trace in traces:
+        for stage, (start, end) in STAGES.items():
+            if trace.get(start) is not None and trace.get(end) is not None:
+                latencies[stage].append(trace[end] - trace[start])
+    return latencies
+
+def histogram(samples):
+    # Power-of-two millisecond buckets: <1ms, 1-2ms, 2-4ms, ...
+    buckets = {}
+    for sample in samples:
+        upper = 1 if sample < 1 else 2 ** math.ceil(math.log2(sample + 1e-9))
+        buckets[upper] = buckets.get(upper, 0) + 1
+    return sorted(buckets.items())
+
+def print_histogram(buckets):
+    peak = max((count for _, count in buckets), default=0)
+    for upper, count in buckets:
+        lower = 0 if upper == 1 else upper // 2
+        bar = "█" * max(1, round(BAR_WIDTH * count / peak))
+        print(f"   {lower:>7}-{upper:<7} ms | {bar} {count}")
+
+def report(latencies):
+    results = {"queries": {}}
+    for stage, samples in latencies.items():
+        stats = benchmark.summarize(samples)
+        print(f"\n⏱️ {stage} ({len(samples)} readings): {benchmark.format_stats(stats, 'ms')}")
+        buckets = histogram(samples)
+        print_histogram(buckets)
+        results["queries"][stage] = {"stats": stats, "histogram": {str(upper): count for upper, count in buckets},
+                                     "rows": len(samples), "bytes": 0}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency report from a subscriber --trace-log file")
+    parser.add_argument("trace_log")
+    parser.add_argument("--output", help="write the per-stage stats as .json or .csv")
+    args = parser.parse_args()
+
+    results = report(stage_latencies(load_traces(args.trace_log)))
+    results["meta"] = benchmark.run_metadata(trace_log=args.trace_log)
+    if args.output:
+        benchmark.write_results(args.output, results)
+        print(f"💾 Results written to {args.output}")
@@ -0,0 +1,56 @@
+import json
+import time
+import uuid
+import threading
+
+# Sub-properties added to each reading so it can be followed from the simulator to HBase
+SENT_AT = "sentAt"
+TRACE_ID = "traceId"
+RECEIVED_KEY = "_received"
+TRACE_FLUSH_SECONDS = 1.0
+
+def now_millis():
+    return time.time() * 1000
+
+def stamp_attribute(attribute):
+    attribute[SENT_AT] = {"type": "Property", "value": round(now_millis(), 3)}
+    attribute[TRACE_ID] = {"type": "Property", "value": uuid.uuid4().hex}
+    return attribute
+
+def traced_attributes(entity):
+    for name, attribute in entity.items():
+        if isinstance(attribute, dict) and SENT_AT in attribute:
+            yield name, attribute
+
+class TraceLog:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a")
+        self.last_flush = time.monotonic()
+
+    def record(self, entities, dequeued, written):
+        lines = []
+        for entity in entities:
+            received = entity.get(RECEIVED_KEY)
+            for name, attribute in traced_attributes(entity):
+                lines.append(json.dumps({
+                    "id": entity.get("id"),
+                    "attr": name,
+                    "trace_id": attribute.get(TRACE_ID, {}).get("value"),
+                    "sent": attribute[SENT_AT].get("value"),
+                    "received": received,
+                    "dequeued": dequeued,
+                    "written": written,
+                }))
+        if not lines:
+            return
+        with self.lock:
+            self.file.write("\n".join(lines) + "\n")
+            if time.monotonic() - self.last_flush >= TRACE_FLUSH_SECONDS:
+                self.file.flush()
+                self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
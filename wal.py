@@ -0,0 +1,273 @@
+import os
+import json
+import mmap
+import glob
+import zlib
+import queue
+import time
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+# The subscriber's logger, so sync errors are leveled and rate-limited like the rest of its messages
+log = logging.getLogger("subscriber")
+
+WAL_SEGMENT_MB = 64
+WAL_MAX_MB = 4096
+WAL_SYNC_MS = 100
+
+# length (4 bytes) | crc32 of the payload (4 bytes) | JSON payload; a zero length marks the unused tail of a segment
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_NAME = "segment-{:08d}.log"
+CHECKPOINT_NAME = "checkpoint.json"
+
+class Segment:
+    def __init__(self, path, index, size):
+        self.path = path
+        self.index = index
+        exists = os.path.exists(path)
+        self.file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            # Preallocated and zero-filled, so the first zero header is always the end of the data
+            self.file.truncate(size)
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    def record_at(self, offset):
+        # Returns (payload, next offset), or None at the end of the valid data
+        if offset + RECORD_HEADER.size > self.size:
+            return None
+        length, crc = RECORD_HEADER.unpack_from(self.map, offset)
+        end = offset + RECORD_HEADER.size + length
+        if length == 0 or end > self.size:
+            return None
+        payload = self.map[offset + RECORD_HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            # Torn write from a crash: nothing after it was acknowledged to a client
+            return None
+        return payload, end
+
+    def write_at(self, offset, payload):
+        # Payload first, header last: a record only becomes valid once it is complete
+        self.map[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + len(payload)] = payload
+        RECORD_HEADER.pack_into(self.map, offset, len(payload), zlib.crc32(payload))
+        return offset + RECORD_HEADER.size + len(payload)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+class SegmentLog:
+    # Append-only log of entities in memory-mapped segment files. Batches handed out by read() are acknowledged
+    # with ack(); the checkpoint only moves over a contiguous prefix of acknowledged batches, so everything after
+    # it is read again after a restart (at-least-once).
+    def __init__(self, directory, segment_mb=WAL_SEGMENT_MB, max_mb=WAL_MAX_MB, sync_ms=WAL_SYNC_MS):
+        self.directory = directory
+        self.segment_bytes = segment_mb * 1024 * 1024
+        self.max_segments = max(2, max_mb // segment_mb)
+        self.sync_seconds = sync_ms / 1000
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.readable = threading.Condition(self.lock)
+        self.read_lock = threading.Lock()
+        # Held for a whole sync() and while closing, so a sync never flushes a segment that is being closed or
+        # dropped, and checkpoints are saved in order
+        self.sync_lock = threading.Lock()
+        self.segments = {}
+        self.inflight = OrderedDict()
+        self.next_token = 0
+        self.dirty = False
+        self.closed = False
+
+        self.checkpoint = self.load_checkpoint()
+        self.saved_checkpoint = self.checkpoint
+        for index in self.segment_indexes():
+            if index < self.checkpoint[0]:
+                # Left behind by a crash between saving the checkpoint and deleting them
+                os.remove(os.path.join(directory, SEGMENT_NAME.format(index)))
+        self.read_position = self.checkpoint
+        self.write_position, self.pending = self.recover()
+        self.stats = {"appended": 0, "read": 0, "recovered": self.pending}
+
+        self.syncer = threading.Thread(target=self.sync_loop, daemon=True)
+        self.syncer.start()
+
+    def segment(self, index):
+        if index not in self.segments:
+            path = os.path.join(self.directory, SEGMENT_NAME.format(index))
+            self.segments[index] = Segment(path, index, self.segment_bytes)
+        return self.segments[index]
+
+    def segment_indexes(self):
+        names = glob.glob(os.path.join(self.directory, SEGMENT_NAME.replace("{:08d}", "*")))
+        return sorted(int(os.path.basename(name)[len("segment-"):-len(".log")]) for name in names)
+
+    def load_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            return data["segment"], data["offset"]
+        indexes = self.segment_indexes()
+        return (indexes[0] if indexes else 0), 0
+
+    def save_checkpoint(self, position):
+        path = os.path.join(self.directory, CHECKPOINT_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": position[0], "offset": position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def recover(self):
+        # Walks from the checkpoint to the last valid record; that is where appends continue
+        index, offset = self.checkpoint
+        last = max(self.segment_indexes(), default=index)
+        pending = 0
+        while True:
+            record = self.segment(index).record_at(offset)
+            if record is not None:
+                offset = record[1]
+                pending += 1
+            elif index < last:
+                index, offset = index + 1, 0
+            else:
+                return (index, offset), pending
+
+    def append_many(self, payloads):
+        # All or nothing: raises queue.Full without writing anything when the log is out of space
+        encoded = [json.dumps(payload, separators=(",", ":")).encode() for payload in payloads]
+        with self.lock:
+            if self.closed:
+                raise queue.Full
+            index, offset = self.write_position
+            needed_segments = 0
+            for data in encoded:
+                size = RECORD_HEADER.size + len(data)
+                if size > self.segment_bytes:
+                    raise ValueError(f"record of {size} bytes does not fit a {self.segment_bytes}-byte segment")
+                if offset + size > self.segment_bytes:
+                    needed_segments += 1
+                    offset = 0
+                offset += size
+            if index + needed_segments - self.checkpoint[0] + 1 > self.max_segments:
+                raise queue.Full
+
+            index, offset = self.write_position
+            for data in encoded:
+                if offset + RECORD_HEADER.size + len(data) > self.segment_bytes:
+                    index, offset = index + 1, 0
+                offset = self.segment(index).write_at(offset, data)
+            self.write_position = (index, offset)
+            self.pending += len(encoded)
+            self.stats["appended"] += len(encoded)
+            self.dirty = True
+            self.readable.notify_all()
+        if self.sync_seconds == 0:
+            self.sync()
+
+    def read(self, max_items, max_wait):
+        # Blocks for the first record, then waits up to max_wait for the batch to fill. Returns (token, payloads).
+        # read_lock keeps each batch a contiguous range of the log even with several writer threads
+        with self.read_lock:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.readable.wait()
+                payloads = []
+                deadline = time.monotonic() + max_wait
+                while len(payloads) < max_items:
+                    if self.pending:
+                        payloads.append(self.read_one())
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.readable.wait(remaining):
+                        break
+                token = self.next_token
+                self.next_token += 1
+                self.inflight[token] = [self.read_position, False]
+            return token, payloads
+
+    def read_one(self):
+        index, offset = self.read_position
+        record = self.segment(index).record_at(offset)
+        if record is None:
+            index, offset = index + 1, 0
+            record = self.segment(index).record_at(offset)
+        payload, offset = record
+        self.read_position = (index, offset)
+        self.pending -= 1
+        self.stats["read"] += 1
+        return json.loads(payload)
+
+    def ack(self, token):
+        with self.lock:
+            self.inflight[token][1] = True
+            while self.inflight:
+                first = next(iter(self.inflight))
+                end, done = self.inflight[first]
+                if not done:
+                    break
+                del self.inflight[first]
+                self.checkpoint = end
+                self.dirty = True
+
+    def sync(self):
+        with self.sync_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                self.dirty = False
+                checkpoint = self.checkpoint
+                live = list(self.segments.values())
+            for segment in live:
+                segment.flush()
+            # Never step back: an older checkpoint could point into a segment that has already been dropped
+            if checkpoint > self.saved_checkpoint:
+                self.save_checkpoint(checkpoint)
+                self.saved_checkpoint = checkpoint
+                self.drop_segments(checkpoint[0])
+
+    def drop_segments(self, first_live):
+        # Segments entirely before the persisted checkpoint are never read again
+        with self.lock:
+            done = [index for index in self.segments if index < first_live]
+            segments = [self.segments.pop(index) for index in done]
+        for segment in segments:
+            segment.close()
+            os.remove(segment.path)
+
+    def sync_loop(self):
+        while not self.closed:
+            time.sleep(self.sync_seconds or 1.0)
+            try:
+                self.sync()
+            except Exception as e:
+                log.error("❌ WAL sync failed: %s", e)
+
+    def depth(self):
+        with self.lock:
+            return self.pending
+
+    def idle(self):
+        # Nothing left to read and every batch handed out has been acknowledged
+        with self.lock:
+            return not self.pending and not self.inflight
+
+    def size_bytes(self):
+        with self.lock:
+            return len(self.segments) * self.segment_bytes
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.readable.notify_all()
+        self.sync()
+        with self.sync_lock, self.lock:
+            for segment in self.segments.values():
+                segment.close()
+            self.segments.clear()
@@ -0,0 +1,91 @@
+import time
+import threading
+
+import happybase
+
+from codec import LONG
+
+HBASE_HOST = "localhost"
+WATERMARK_TABLE = "ingest_watermark"
+WATERMARK_FLUSH_SECONDS = 1.0
+VERSION_COLUMN = b"cf:version"
+WRITTEN_COLUMN = b"cf:written"
+
+def ensure_watermark_table(connection):
+    # Never reset along with the data tables: versions must keep increasing across reloads
+    if WATERMARK_TABLE.encode() not in connection.tables():
+        connection.create_table(WATERMARK_TABLE, {'cf': dict()})
+        print(f"✅ Created table: {WATERMARK_TABLE}")
+
+def advance_watermarks(connection, table_names):
+    # One row per data table; the counter only goes up, so readers just compare versions
+    table = connection.table(WATERMARK_TABLE.encode())
+    written = LONG.pack(int(time.time() * 1000))
+    for table_name in table_names:
+        rowkey = table_name.encode()
+        table.counter_inc(rowkey, VERSION_COLUMN)
+        table.put(rowkey, {WRITTEN_COLUMN: written})
+
+def read_watermarks(connection):
+    table = connection.table(WATERMARK_TABLE.encode())
+    return {rowkey.decode(): LONG.unpack(data[VERSION_COLUMN])[0]
+            for rowkey, data in table.scan(columns=[VERSION_COLUMN]) if VERSION_COLUMN in data}
+
+class WatermarkTracker:
+    # Ingest side: writers mark tables as dirty and a background flush advances them at most once per interval,
+    # so the watermark costs a few RPCs per second instead of one per batch
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirty = set()
+
+    def mark(self, table_name):
+        with self.lock:
+            self.dirty.add(table_name)
+
+    def drain(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def flush(self, connection):
+        dirty = self.drain()
+        if not dirty:
+            return 0
+        try:
+            advance_watermarks(connection, sorted(dirty))
+        except Exception:
+            with self.lock:
+                self.dirty |= dirty
+            raise
+        return len(dirty)
+
+class HBaseWatermarks:
+    # Query side: the watermark table is re-read at most every `poll_seconds`, which bounds how stale a cached
+    # result can be while keeping cache hits free of RPCs
+    def __init__(self, host=HBASE_HOST, poll_seconds=WATERMARK_FLUSH_SECONDS):
+        self.host = host
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.connection = None
+        self.versions = {}
+        self.polled = None
+
+    def __call__(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.polled is None or now - self.polled >= self.poll_seconds:
+                if self.connection is None:
+                    self.connection = happybase.Connection(self.host)
+                try:
+                    self.versions = read_watermarks(self.connection)
+                except Exception:
+                    self.connection = None
+                    raise
+                self.polled = now
+            return self.versions
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,206 @@
+import os
+import time
+import zlib
+import queue
+import asyncio
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+
+from aiohttp import web
+
+import subscriber
+import async_subscriber
+from subscriber import log
+from metrics import setup_logging
+
+# Multi-process subscriber: several aiohttp receivers share the notification port through SO_REUSEPORT and hand
+# the decoded entities to writer processes over pipe-backed multiprocessing queues. Entities are partitioned by id,
+# so all updates of an entity (and the hourly rollup rows of its room) go through a single writer process.
+# With --wal-dir a receiver only answers 200 once every writer involved has appended its entities to its own WAL,
+# which keeps the at-least-once guarantee across crashes. Without it, entities accepted but still in an inbox or
+# a writer's RAM buffer are lost if that writer dies or the group is stopped, as with the single-process buffer.
+
+RECEIVER_PROCESSES = 2
+WRITER_PROCESSES = 2
+INBOX_SIZE = 1000
+INBOX_RETRY_SECONDS = 0.01
+READY_TIMEOUT = 30
+# How long a receiver waits for the writers' WAL appends before answering 429
+APPEND_TIMEOUT = 10
+RECEIVER_THREADS = 32
+
+def partition(entity_id, partitions):
+    # crc32 rather than hash(): str hashes are salted per process and every receiver must agree
+    return zlib.crc32(entity_id.encode()) % partitions
+
+class Forwarder:
+    # subscriber.forward of a receiver process; runs in the aiohttp executor threads, never on the event loop.
+    # Raises queue.Full (429) when an inbox is full or, in WAL mode, when a writer could not append in time.
+    def __init__(self, inboxes, receiver, replies=None, timeout=APPEND_TIMEOUT):
+        self.inboxes = inboxes
+        self.receiver = receiver
+        self.replies = replies
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.waiting = {}
+        self.next_id = 0
+        if replies is not None:
+            threading.Thread(target=self.collect_replies, daemon=True).start()
+
+    def __call__(self, entities):
+        groups = defaultdict(list)
+        for entity in entities:
+            groups[partition(entity["id"], len(self.inboxes))].append(entity)
+        if any(self.inboxes[p].full() for p in groups):
+            raise queue.Full
+        if self.replies is None:
+            # Another receiver can fill an inbox after the check: the groups already put stay queued, and the
+            # 429 only makes the sender resend them (at least once, as with a WAL replay)
+            for p, group in groups.items():
+                self.inboxes[p].put_nowait((None, None, group))
+            return
+
+        with self.lock:
+            request_id = self.next_id
+            self.next_id += 1
+            done = threading.Event()
+            self.waiting[request_id] = [done, len(groups), True]
+        try:
+            for p, group in groups.items():
+                self.inboxes[p].put_nowait((self.receiver, request_id, group))
+            done.wait(self.timeout)
+        finally:
+            with self.lock:
+                _, remaining, appended = self.waiting.pop(request_id)
+        if remaining or not appended:
+            raise queue.Full
+
+    def collect_replies(self):
+        while True:
+            request_id, appended = self.replies.get()
+            with self.lock:
+                waiting = self.waiting.get(request_id)
+                if waiting is None:
+                    continue
+                waiting[1] -= 1
+                waiting[2] = waiting[2] and appended
+                if waiting[1] == 0 or not appended:
+                    waiting[0].set()
+
+def admin_ports(args):
+    # One /metrics and /stats listener per process: receivers first, then writers
+    first = args.admin_port or args.port + 1
+    receivers = [first + i for i in range(args.receivers)]
+    writers = [first + args.receivers + i for i in range(args.writer_processes)]
+    return receivers, writers
+
+def run_receiver(args, index, inboxes, replies, ready):
+    # Receivers skip subscriber.configure(), which would open a WAL and a write_buffer they do not use,
+    # so the settings of the notification path are applied here
+    setup_logging(args.log_level)
+    subscriber.LOG_LEVEL = args.log_level
+    subscriber.LOG_SAMPLE_RATE = args.log_sample_rate
+    subscriber.forward = Forwarder(inboxes, index, replies if args.wal_dir else None)
+
+    async def serve():
+        # enqueue_notification runs in these threads and, in WAL mode, waits there for the writers' appends
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(RECEIVER_THREADS))
+        runner = web.AppRunner(async_subscriber.create_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, args.port, reuse_port=True).start()
+        await web.TCPSite(runner, args.host, admin_ports(args)[0][index]).start()
+        log.info("📡 Receiver %d listening on %s:%d", index, args.host, args.port)
+        ready.put(index)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+def writer_args(args, index):
+    args = argparse.Namespace(**vars(args))
+    if args.wal_dir:
+        args.wal_dir = os.path.join(args.wal_dir, f"writer-{index}")
+    if args.trace_log:
+        root, ext = os.path.splitext(args.trace_log)
+        args.trace_log = f"{root}-writer-{index}{ext}"
+    return args
+
+def run_writer(args, index, inbox, replies):
+    from werkzeug.serving import make_server
+    subscriber.configure(writer_args(args, index))
+    subscriber.start_writers()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    admin = make_server(args.host, admin_ports(args)[1][index], subscriber.app, threaded=True)
+    threading.Thread(target=admin.serve_forever, daemon=True).start()
+    log.info("🔧 Writer process %d started with %d hbase_writer threads", index, subscriber.WRITER_THREADS)
+    while True:
+        receiver, request_id, entities = inbox.get()
+        if request_id is not None:
+            # WAL mode: the receiver answers only after this reply, so a full WAL becomes its 429
+            try:
+                subscriber.buffer_entities(entities)
+                replies[receiver].put((request_id, True))
+            except queue.Full:
+                replies[receiver].put((request_id, False))
+            continue
+        # A full buffer stalls this loop, the inbox fills up and the receivers start answering 429
+        while True:
+            try:
+                subscriber.buffer_entities(entities)
+                break
+            except queue.Full:
+                time.sleep(INBOX_RETRY_SECONDS)
+
+if __name__ == "__main__":
+    parser = subscriber.build_arg_parser("Multi-process Orion-LD notification subscriber writing to HBase")
+    parser.add_argument("--receivers", type=int, default=RECEIVER_PROCESSES,
+                        help="receiver processes sharing --port via SO_REUSEPORT")
+    parser.add_argument("--writer-processes", type=int, default=WRITER_PROCESSES,
+                        help="writer processes, each owning the entities whose id hashes to it")
+    parser.add_argument("--inbox-size", type=int, default=INBOX_SIZE,
+                        help="notifications queued per writer process before receivers answer 429")
+    parser.add_argument("--admin-port", type=int,
+                        help="first port of the per-process /metrics and /stats listeners (default: --port + 1)")
+    # One hbase_writer thread per process writes every entity's updates in receive order;
+    # more threads overlap HBase round trips but may reorder batches of the same entity
+    parser.set_defaults(writers=1)
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    subscriber.reset_tables_on_start(args)
+    inboxes = [multiprocessing.Queue(args.inbox_size) for _ in range(args.writer_processes)]
+    replies = [multiprocessing.Queue() for _ in range(args.receivers)]
+    ready = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_writer, args=(args, i, inboxes[i], replies), name=f"writer-{i}")
+                 for i in range(args.writer_processes)]
+    processes += [multiprocessing.Process(target=run_receiver, args=(args, i, inboxes, replies[i], ready),
+                                          name=f"receiver-{i}") for i in range(args.receivers)]
+    for process in processes:
+        process.start()
+    failed = False
+    try:
+        for _ in range(args.receivers):
+            ready.get(timeout=READY_TIMEOUT)
+        subscriber.setup_subscription()
+        receiver_ports, writer_ports = admin_ports(args)
+        log.info("📊 /metrics and /stats: receivers on %s, writers on %s", receiver_ports, writer_ports)
+        # Any process exiting takes the whole group down, so a supervisor sees the failure and restarts it
+        exited = wait([process.sentinel for process in processes])
+        log.error("❌ %s exited, stopping", ", ".join(p.name for p in processes if p.sentinel in exited))
+        failed = True
+    except queue.Empty:
+        log.error("❌ Receivers did not start within %ds", READY_TIMEOUT)
+        failed = True
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    if failed:
+        raise SystemExit(1)